@@ -1,12 +1,17 @@
 import celery
 from flask import Flask, redirect, url_for
 
+from application_insights import ApplicationInsightsService
+from devops import DevOpsService
+from github_graphql import GitHubGraphQLService
+from json_object import json_backend
+
 from .models import db, migrate
-from .common import login_manager
+from .common import login_manager, store, metrics, mqtt
 from .api import api_bp
 from .web import web_bp, tasks_bp, accounts_bp, messages_bp, gauges_bp, devices_bp, settings_bp
 from .tasks import celery_app
-from .services import jwt
+from .services import jwt, WebAccountService
 
 
 def make_celery(app):
@@ -21,6 +26,20 @@ def make_celery(app):
     return celery_app
 
 
+def configure_http_clients(app):
+    options = app.config.get('HTTP_CLIENT_OPTIONS', {})
+    clients = (DevOpsService.client, ApplicationInsightsService.client, GitHubGraphQLService.client,
+               WebAccountService.client)
+    for client in clients:
+        client.configure(**options.get(client.name, {}))
+        client.observer = metrics.record_request
+        client.shared = store
+
+
+def configure_json(app):
+    json_backend.configure(app.config.get('JSON_BACKEND', 'auto'))
+
+
 def build_app(config):
     app = Flask('ambrose')
     app.config.from_object(config)
@@ -29,6 +48,10 @@ def build_app(config):
     migrate.init_app(app, db)
     login_manager.init_app(app)
     jwt.init_app(app)
+    store.init_app(app)
+    mqtt.init_app(app)
+    configure_http_clients(app)
+    configure_json(app)
 
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(web_bp, url_prefix='/web')
@@ -2,7 +2,7 @@ import inspect
 from typing import Any, Dict, Type
 
 from cryptography.fernet import Fernet
-from flask import Blueprint, request, abort
+from flask import Blueprint, request, abort, current_app, Response, stream_with_context
 from flask.views import MethodView
 from flask_jwt_extended import jwt_required, get_current_user
 
@@ -10,9 +10,10 @@ from ambrose.common import cipher_required
 from ambrose.models import User, Account
 from ambrose.services import LightService, AuthService, UserCredentialMismatchException, \
     UserService, NotFoundException, UnauthorizedAccessException, GitHubAccountService, DevOpsAccountService, \
-    AccountService
+    AccountService, StatusService, StatusSnapshot
 from devops import DevOpsReleaseWebHook
-from .schema import TaskSchema, StatusSchema, with_schema, LoginSchema, AccessTokenSchema, RegisterDeviceSchema
+from .schema import TaskSchema, with_schema, LoginSchema, AccessTokenSchema, RegisterDeviceSchema, json_body_response
+from .status import serialize_status, status_events, delta_body
 from .messages import Messages
 from .tasks import Tasks
 from .devices import Devices
@@ -47,20 +48,52 @@ register_api(Devices, 'devices', pk='device_id')
 
 
 @api_bp.route('/status')
-@with_schema(StatusSchema)
+def get_status() -> Response:
+    # a device whose status hasn't changed since its last poll is answered from its snapshot, without loading anything
+    device_uuid = AuthService.token_identity()
+    snapshot = StatusService.snapshot(device_uuid) if device_uuid else None
+    if snapshot is None:
+        snapshot = build_status()
+
+    # a device that sends the ETag of the status it has as ?since= is sent only the changes, if that status is still
+    # kept; otherwise the full status
+    since = request.args.get('since')
+    body = None
+    if since and device_uuid:
+        body = delta_body(device_uuid, since, snapshot)
+
+    # devices that send the ETag of the status they have get a 304 without a body when it is still current
+    response = json_body_response(body or snapshot.body)
+    response.set_etag(snapshot.etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 @jwt_required
-def get_status() -> Dict[str, Any]:
+def build_status() -> StatusSnapshot:
     device = get_current_user()
-    user = device.user
+    service = StatusService(device)
+    version = StatusService.version(device.user_id)
 
-    retval = {
-        "lights": LightService(user.light_settings).lights_for_device(device),
-        "messages": [m.value for m in user.messages],
-        'gauges': user.gauges
-    }
+    snapshot = serialize_status(service)
+    service.save_history(snapshot, current_app.config.get('STATUS_HISTORY_TTL', 0))
+    UserService(device.user).mark_device_visit(device)
+
+    # if the visit reset a light's has_changed, the next status differs and the version has moved on
+    if StatusService.version(device.user_id) == version:
+        service.save_snapshot(version, snapshot, service.max_age(current_app.config.get('STATUS_SNAPSHOT_TTL', 0)))
+    return snapshot
+
+
+@api_bp.route('/status/stream')
+@jwt_required
+def stream_status() -> Response:
+    device = get_current_user()
+    heartbeat = current_app.config.get('STATUS_STREAM_HEARTBEAT', 15)
+    events = status_events(device.device_uuid, device.user_id, request.headers.get('Last-Event-ID'), heartbeat)
 
-    UserService(user).mark_device_visit(device)
-    return retval
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @api_bp.route('/login', methods=['POST'])
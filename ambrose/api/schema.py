@@ -2,9 +2,11 @@ import functools
 from collections import abc
 from typing import Union, Type, Callable
 
-from flask import jsonify
+from flask import current_app, jsonify, Response
 from marshmallow import Schema, fields
 
+from json_object import json_backend
+
 
 class ColorSchema(Schema):
     red = fields.Integer()
@@ -62,6 +64,24 @@ class RegisterDeviceSchema(Schema):
     messages = fields.Boolean()
 
 
+def json_response(data) -> Response:
+    """
+    Like jsonify, but encoded with the configured JSON backend, which jsonify can't use on Flask 1.x. The backends
+    don't indent, so pretty-printed responses (in debug mode or with JSONIFY_PRETTYPRINT_REGULAR) are left to jsonify.
+    """
+    if current_app.config.get('JSONIFY_PRETTYPRINT_REGULAR') or current_app.debug:
+        return jsonify(data)
+    return json_body_response(json_backend.dumps(data))
+
+
+def json_body_response(body: str) -> Response:
+    """
+    A response for an already serialized JSON body
+    """
+    mimetype = current_app.config.get('JSONIFY_MIMETYPE', 'application/json')
+    return current_app.response_class(body + '\n', mimetype=mimetype)
+
+
 def with_schema(schema: Union[Type[Schema], Schema]) -> Callable[[Callable], Callable]:
     def decorator(func):
         @functools.wraps(func)
@@ -74,7 +94,7 @@ def with_schema(schema: Union[Type[Schema], Schema]) -> Callable[[Callable], Cal
             else:
                 converter = schema
 
-            return jsonify(converter.dump(retval, many=many))
+            return json_response(converter.dump(retval, many=many))
 
         return inner
 
@@ -0,0 +1,129 @@
+import math
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import current_app
+
+from ambrose.common import mqtt
+from ambrose.models import db, Device, User
+from ambrose.services import StatusService, StatusSnapshot, UserService
+from json_object import json_backend
+from .schema import StatusSchema
+
+# how long, in milliseconds, a disconnected stream client waits before reconnecting
+STREAM_RETRY = 5000
+# a status that changes by itself (ie shows the time) is rebuilt at most this often, in seconds
+STREAM_MIN_INTERVAL = 1
+
+
+def serialize_status(service: StatusService) -> StatusSnapshot:
+    body = json_backend.dumps(StatusSchema().dump(service.status()))
+    return StatusSnapshot(StatusService.etag(body), body)
+
+
+def _changed(previous: List[Any], current: List[Any]) -> List[Tuple[int, Any]]:
+    return [(idx, item) for idx, item in enumerate(current) if idx >= len(previous) or previous[idx] != item]
+
+
+def status_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The changes between two status documents: the lights (by slot), messages and gauges (by index) that differ, and
+    the new length of each list, so that a device can drop the items that were removed.
+    """
+    return {
+        'delta': True,
+        'lights': [dict(light, slot=idx + 1) for idx, light in _changed(previous['lights'], current['lights'])],
+        'messages': [{'index': idx, 'value': message}
+                     for idx, message in _changed(previous['messages'], current['messages'])],
+        'gauges': [dict(gauge, index=idx) for idx, gauge in _changed(previous['gauges'], current['gauges'])],
+        'sizes': {key: len(current[key]) for key in ('lights', 'messages', 'gauges')},
+    }
+
+
+def delta_body(device_uuid: str, since: str, snapshot: StatusSnapshot) -> Optional[str]:
+    """
+    :return: the serialized changes to the device's status since the status with ETag since, or None if that status
+    is no longer kept
+    """
+    previous = StatusService.previous(device_uuid, since)
+    if previous is None:
+        return None
+    return json_backend.dumps(status_delta(json_backend.loads(previous), json_backend.loads(snapshot.body)))
+
+
+def _current_status(device_uuid: str, heartbeat: float, sent: Optional[str]) -> Tuple[Optional[StatusSnapshot], float]:
+    """
+    :param sent: the ETag of the status the device already has. A different status is kept in the history and the
+    device's contact is recorded, as it is about to be sent
+    :return: the device's status and how long it stays current, or None if the device no longer exists
+    """
+    device = Device.by_uuid(device_uuid)
+    if device is None:
+        return None, 0
+
+    service = StatusService(device)
+    snapshot = serialize_status(service)
+    max_age = max(service.max_age(heartbeat), STREAM_MIN_INTERVAL)
+
+    # either way, the read transaction ends here, so that an idle stream doesn't hold on to a database connection
+    if snapshot.etag != sent:
+        service.save_history(snapshot, current_app.config.get('STATUS_HISTORY_TTL', 0))
+        UserService(device.user).mark_device_contact(device)
+    else:
+        db.session.commit()
+    return snapshot, max_age
+
+
+def status_events(device_uuid: str, user_id: int, last_event_id: Optional[str], heartbeat: float) -> Iterator[str]:
+    """
+    Server-sent events for a device: a 'status' event with the status document whenever it changes, and a comment
+    every heartbeat seconds while it doesn't. Each event's id is the status' ETag, so a client that reconnects with
+    Last-Event-ID is only sent the status if it changed in the meantime.
+
+    Unlike polling, receiving a status doesn't reset has_changed on the device's lights.
+    """
+    changes = StatusService.changes(user_id)
+    try:
+        yield 'retry: {}\n\n'.format(STREAM_RETRY)
+
+        sent = last_event_id
+        while True:
+            snapshot, max_age = _current_status(device_uuid, heartbeat, sent)
+            if snapshot is None:
+                return
+
+            if snapshot.etag != sent:
+                yield 'id: {}\nevent: status\ndata: {}\n\n'.format(snapshot.etag, snapshot.body)
+                sent = snapshot.etag
+
+            # wait for the user's status to change, or for this status to go stale by itself
+            expires = time.monotonic() + max_age
+            while changes.get(timeout=max(0.0, min(heartbeat, expires - time.monotonic()))) is None:
+                if time.monotonic() >= expires:
+                    break
+                yield ': heartbeat\n\n'
+    finally:
+        changes.close()
+
+
+def publish_device_statuses(user_id: int) -> Optional[float]:
+    """
+    Publishes the status of each of the user's devices to MQTT, if it changed since it was last published. Like the
+    stream, publishing doesn't reset has_changed on the devices' lights. Published statuses are kept in the history, so
+    a device can also poll for the changes since one.
+
+    :return: how long, in seconds, until one of the statuses changes by itself (ie shows the time), or None
+    """
+    user = User.by_id(user_id)
+    if user is None:
+        return None
+
+    max_age = math.inf
+    for device in user.devices:
+        service = StatusService(device)
+        snapshot = serialize_status(service)
+        if mqtt.publish_status(device.device_uuid, snapshot.etag, snapshot.body):
+            service.save_history(snapshot, current_app.config.get('STATUS_HISTORY_TTL', 0))
+        max_age = min(max_age, service.max_age(math.inf))
+
+    return max_age if max_age != math.inf else None
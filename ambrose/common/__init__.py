@@ -7,6 +7,10 @@ from flask import current_app
 
 from ambrose.models import db
 from .login import login_manager
+from .store import store
+from .locks import single_flight
+from .metrics import metrics
+from .mqtt import mqtt
 
 
 def cipher_required(func: Callable) -> Callable:
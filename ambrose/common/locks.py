@@ -0,0 +1,25 @@
+import contextlib
+import uuid
+from typing import Iterator
+
+from .store import store
+
+
+@contextlib.contextmanager
+def single_flight(key: str, ttl: float) -> Iterator[bool]:
+    """
+    Distributed, non-blocking lock. Yields True if the lock was acquired and False if someone else holds it, in which
+    case the caller is expected to skip its work. The ttl bounds how long a crashed holder can keep the lock.
+
+    :param key: identifies the work being guarded, ie 'poll:account:1'
+    :param ttl: seconds after which the lock expires, even if it was never released
+    """
+    key = 'lock:' + key
+    token = uuid.uuid4().hex
+    acquired = store.add(key, token, ttl)
+    try:
+        yield acquired
+    finally:
+        # only release the lock if it is still ours - it may have expired and been taken by someone else
+        if acquired:
+            store.delete_if(key, token)
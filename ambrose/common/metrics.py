@@ -0,0 +1,41 @@
+from typing import Optional
+
+from .store import store
+
+
+class Metrics:
+    """
+    Counters kept in the shared store, so they aggregate across all web and worker processes.
+    """
+    PREFIX = 'metrics:'
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        return store.incr(self.PREFIX + name, amount)
+
+    def get(self, name: str) -> int:
+        return int(store.get(self.PREFIX + name) or 0)
+
+    def timing(self, name: str, seconds: float):
+        """
+        Records a duration. Kept as a count and a total in milliseconds, see mean().
+        """
+        self.incr(name + '.count')
+        self.incr(name + '.total_ms', int(seconds * 1000))
+
+    def mean(self, name: str) -> float:
+        """
+        The mean of the durations recorded with timing(), in milliseconds
+        """
+        count = self.get(name + '.count')
+        return self.get(name + '.total_ms') / count if count else 0.0
+
+    def record_request(self, client: str, method: str, url: str, status: Optional[int], seconds: float):
+        """
+        Observer for http_client.HTTPClient - records the latency of each upstream request, and counts failures
+        """
+        self.timing('http.' + client, seconds)
+        if status is None or status >= 500:
+            self.incr('http.{}.errors'.format(client))
+
+
+metrics = Metrics()
@@ -0,0 +1,160 @@
+import os
+import threading
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from flask import Flask
+
+from .store import store
+
+try:
+    from paho.mqtt import client as paho
+except ImportError:  # pragma: no cover - MQTT publishing is optional
+    paho = None
+
+MQTTMessage = namedtuple('MQTTMessage', 'topic payload qos retain')
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """
+    Whether topic matches an MQTT subscription filter, with its + (one level) and # (all remaining levels) wildcards
+    """
+    filter_levels = topic_filter.split('/')
+    levels = topic.split('/')
+    for idx, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if idx >= len(levels) or (level != '+' and level != levels[idx]):
+            return False
+    return len(filter_levels) == len(levels)
+
+
+class MemoryBroker:
+    """
+    In-process stand-in for an MQTT broker, used when MQTT_URL is memory:// (ie, in tests). Like a real broker, it keeps
+    the last retained message of each topic and sends it to new subscribers, and an empty retained message clears it.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.retained: Dict[str, MQTTMessage] = {}
+        self.published: List[MQTTMessage] = []
+        self._subscribers: List[Tuple[str, Callable[[MQTTMessage], None]]] = []
+
+    def publish(self, topic: str, payload: Union[str, bytes], qos: int = 0, retain: bool = False):
+        payload = payload.encode('utf-8') if isinstance(payload, str) else payload
+        message = MQTTMessage(topic, payload, qos, retain)
+        with self._lock:
+            self.published.append(message)
+            if retain and payload:
+                self.retained[topic] = message
+            elif retain:
+                self.retained.pop(topic, None)
+            callbacks = [callback for topic_filter, callback in self._subscribers if topic_matches(topic_filter, topic)]
+
+        # messages forwarded to existing subscribers don't have the retain flag, only those sent on subscribing do
+        for callback in callbacks:
+            callback(message._replace(retain=False))
+
+    def subscribe(self, topic_filter: str, callback: Callable[[MQTTMessage], None]):
+        with self._lock:
+            self._subscribers.append((topic_filter, callback))
+            retained = [message for topic, message in self.retained.items() if topic_matches(topic_filter, topic)]
+
+        for message in retained:
+            callback(message)
+
+
+class PahoBroker:
+    """
+    A connection to a real MQTT broker, given as mqtt://[user:password@]host[:port] or mqtts:// for TLS. The client
+    reconnects and sends queued QoS 1 messages from its own network thread.
+    """
+
+    def __init__(self, url: str):
+        if paho is None:
+            raise RuntimeError('paho-mqtt is required to publish to an MQTT broker')
+
+        parsed = urlparse(url)
+        tls = parsed.scheme == 'mqtts'
+        # paho-mqtt 2 requires the callback API version to be chosen
+        args = (paho.CallbackAPIVersion.VERSION2,) if hasattr(paho, 'CallbackAPIVersion') else ()
+        self.client = paho.Client(*args)
+        if parsed.username:
+            self.client.username_pw_set(parsed.username, parsed.password)
+        if tls:
+            self.client.tls_set()
+
+        self.client.connect_async(parsed.hostname, parsed.port or (8883 if tls else 1883))
+        self.client.loop_start()
+
+    def publish(self, topic: str, payload: Union[str, bytes], qos: int = 0, retain: bool = False):
+        self.client.publish(topic, payload, qos=qos, retain=retain)
+
+
+class MQTTPublisher:
+    """
+    Publishes device statuses to MQTT, for firmware that would rather subscribe than poll /api/status.
+
+    Each device's status document (the same JSON as /api/status) is published on its own topic,
+    <MQTT_TOPIC_PREFIX>/<device_uuid>/status, whenever it changes:
+
+    - messages are retained, so the broker keeps the latest status and sends it to a device as soon as it (re)subscribes.
+      A deleted device's retained status is cleared.
+    - messages are sent with MQTT_QOS, 1 (at least once) by default. A status is a whole document rather than a change,
+      so a duplicate delivery is harmless.
+
+    The broker connection is made on first use in each process, so that forked worker processes get their own.
+    """
+    # the ETag of the status last published to each device's topic
+    PUBLISHED_KEY = 'mqtt:published:{}'
+
+    def __init__(self, app: Optional[Flask] = None):
+        self.url = None
+        self.topic_prefix = 'ambrose/devices'
+        self.qos = 1
+        self._broker = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.url = app.config.get('MQTT_URL')
+        self.topic_prefix = app.config.get('MQTT_TOPIC_PREFIX', self.topic_prefix)
+        self.qos = app.config.get('MQTT_QOS', self.qos)
+        self._broker = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url) and (self.url.startswith('memory://') or paho is not None)
+
+    @property
+    def broker(self) -> Union[MemoryBroker, PahoBroker]:
+        if self._broker is None or self._pid != os.getpid():
+            self._broker = MemoryBroker() if self.url.startswith('memory://') else PahoBroker(self.url)
+            self._pid = os.getpid()
+        return self._broker
+
+    def topic(self, device_uuid: str) -> str:
+        return '{}/{}/status'.format(self.topic_prefix, device_uuid)
+
+    def publish_status(self, device_uuid: str, etag: str, body: str) -> bool:
+        """
+        Publishes a device's status, unless it is the status last published for the device.
+        :return: True if the status was published
+        """
+        key = self.PUBLISHED_KEY.format(device_uuid)
+        if store.get(key) == etag:
+            return False
+
+        self.broker.publish(self.topic(device_uuid), body, qos=self.qos, retain=True)
+        store.set(key, etag)
+        return True
+
+    def clear_status(self, device_uuid: str):
+        self.broker.publish(self.topic(device_uuid), b'', qos=self.qos, retain=True)
+        store.delete(self.PUBLISHED_KEY.format(device_uuid))
+
+
+mqtt = MQTTPublisher()
@@ -0,0 +1,346 @@
+import fnmatch
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Optional, Dict, Tuple, Set, Union
+
+import redis
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+class MemorySubscription:
+    def __init__(self, backend: 'MemoryBackend', channels: Tuple[str, ...], patterns: Tuple[str, ...] = ()):
+        self._backend = backend
+        self.channels = channels
+        self.patterns = patterns
+        self.messages = queue.Queue()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Union[str, Tuple[str, str]]]:
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._backend.unsubscribe(self)
+
+
+class MemoryBackend:
+    """
+    In-process stand-in for the Redis backend, used when no Redis URL is configured (ie, in tests).
+    Only shared between the threads of a single process.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._subscriptions: Dict[str, Set[MemorySubscription]] = {}
+        self._pattern_subscriptions: Dict[str, Set[MemorySubscription]] = {}
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (str(value), time.monotonic() + ttl if ttl else None)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self.set(key, value, ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if(self, key: str, value: str) -> bool:
+        with self._lock:
+            if self._get(key) != str(value):
+                return False
+            del self._data[key]
+            return True
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self._get(key) or 0) + amount
+            _, expires = self._data.get(key, (None, None))
+            self._data[key] = (str(value), expires)
+            return value
+
+    def publish(self, channel: str, message: str):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+            pattern_subscriptions = [subscription for pattern, matching in self._pattern_subscriptions.items()
+                                     if fnmatch.fnmatchcase(channel, pattern) for subscription in matching]
+        for subscription in subscriptions:
+            subscription.messages.put(str(message))
+        for subscription in pattern_subscriptions:
+            subscription.messages.put((channel, str(message)))
+
+    def subscribe(self, *channels: str) -> MemorySubscription:
+        subscription = MemorySubscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def psubscribe(self, *patterns: str) -> MemorySubscription:
+        subscription = MemorySubscription(self, (), patterns)
+        with self._lock:
+            for pattern in patterns:
+                self._pattern_subscriptions.setdefault(pattern, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: MemorySubscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.get(channel, set()).discard(subscription)
+            for pattern in subscription.patterns:
+                self._pattern_subscriptions.get(pattern, set()).discard(subscription)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        # get_message returns None for the subscribe confirmations as well, so keep waiting until the deadline
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else 1.0
+            message = self._pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                return self._item(message)
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+
+    def _item(self, message):
+        return message['data']
+
+    def close(self):
+        self._pubsub.close()
+
+
+class RedisPatternSubscription(RedisSubscription):
+    def _item(self, message) -> Tuple[str, str]:
+        return message['channel'], message['data']
+
+
+class RedisBackend:
+    _DELETE_IF = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._delete_if = self.client.register_script(self._DELETE_IF)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self.client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(self.client.set(key, value, px=int(ttl * 1000) if ttl else None, nx=True))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+    def delete_if(self, key: str, value: str) -> bool:
+        return bool(self._delete_if(keys=[key], args=[value]))
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.client.incrby(key, amount)
+
+    def publish(self, channel: str, message: str):
+        self.client.publish(channel, message)
+
+    def subscribe(self, *channels: str) -> RedisSubscription:
+        pubsub = self.client.pubsub()
+        pubsub.subscribe(*channels)
+        return RedisSubscription(pubsub)
+
+    def psubscribe(self, *patterns: str) -> RedisPatternSubscription:
+        pubsub = self.client.pubsub()
+        pubsub.psubscribe(*patterns)
+        return RedisPatternSubscription(pubsub)
+
+
+class LocalSubscription:
+    """
+    A subscription to one channel, fed by a Fanout rather than by a connection of its own
+    """
+
+    def __init__(self, fanout: 'Fanout', channel: str):
+        self._fanout = fanout
+        self.channel = channel
+        self.messages = queue.Queue()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._fanout.unsubscribe(self)
+
+
+class Fanout:
+    """
+    Shares a single backend subscription to a channel pattern between all the subscribers of the channels it matches
+    in a process. A reader thread (a greenlet, under gevent) hands each message to the local subscriptions of its
+    channel, so any number of subscribers costs one Redis connection per process.
+
+    The backend subscription is made by the first subscriber in each process, so forked workers make their own.
+    """
+    # how long the reader waits for a message before checking whether it is still needed, and waits before
+    # subscribing again after losing the backend subscription, in seconds
+    READ_TIMEOUT = 1.0
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, store: 'Store', pattern: str):
+        self._store = store
+        self.pattern = pattern
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, Set[LocalSubscription]] = {}
+        self._backend_subscription = None
+        self._pid = None
+
+    def subscribe(self, channel: str) -> LocalSubscription:
+        subscription = LocalSubscription(self, channel)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+            if self._backend_subscription is None or self._pid != os.getpid():
+                # subscribed before returning, so that nothing published from now on is missed
+                self._backend_subscription = self._store.backend.psubscribe(self.pattern)
+                self._pid = os.getpid()
+                threading.Thread(target=self._read, args=(self._backend_subscription,), daemon=True).start()
+        return subscription
+
+    def unsubscribe(self, subscription: LocalSubscription):
+        with self._lock:
+            self._subscriptions.get(subscription.channel, set()).discard(subscription)
+
+    def _read(self, backend_subscription):
+        while True:
+            with self._lock:
+                if backend_subscription is not self._backend_subscription:
+                    backend_subscription.close()
+                    return
+
+            try:
+                item = backend_subscription.get(timeout=self.READ_TIMEOUT)
+            except Exception:
+                logger.exception('Lost the subscription to %s, subscribing again', self.pattern)
+                time.sleep(self.RECONNECT_DELAY)
+                with self._lock:
+                    if backend_subscription is self._backend_subscription:
+                        backend_subscription = self._backend_subscription = self._store.backend.psubscribe(
+                            self.pattern)
+                continue
+
+            if item is None:
+                continue
+            channel, message = item
+            with self._lock:
+                subscriptions = list(self._subscriptions.get(channel, ()))
+            for subscription in subscriptions:
+                subscription.messages.put(message)
+
+
+class Store:
+    """
+    Small key/value store shared between the web and worker processes. It uses the Redis instance that backs the
+    Celery broker when one is configured, and falls back to an in-process MemoryBackend otherwise.
+    """
+
+    def __init__(self, app: Optional[Flask] = None):
+        self.backend = MemoryBackend()
+        self._fanouts: Dict[str, Fanout] = {}
+        self._fanouts_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        url = app.config.get('CELERY_BROKER_URL')
+        if url and url.startswith(('redis://', 'rediss://')):
+            self.backend = RedisBackend(url)
+        else:
+            self.backend = MemoryBackend()
+        with self._fanouts_lock:
+            self._fanouts = {}
+
+    def get(self, key: str) -> Optional[str]:
+        return self.backend.get(key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """
+        Sets key to value. If ttl (in seconds) is given, the key expires after it.
+        """
+        self.backend.set(key, value, ttl)
+
+    def add(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """
+        Sets key to value only if the key does not exist.
+        :return: True if the key was set
+        """
+        return self.backend.add(key, value, ttl)
+
+    def delete(self, key: str):
+        self.backend.delete(key)
+
+    def delete_if(self, key: str, value: str) -> bool:
+        """
+        Atomically deletes key, but only if it is currently set to value.
+        :return: True if the key was deleted
+        """
+        return self.backend.delete_if(key, value)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.backend.incr(key, amount)
+
+    def publish(self, channel: str, message: str):
+        """
+        Sends message to the current subscribers of channel. Messages aren't kept for later subscribers
+        """
+        self.backend.publish(channel, message)
+
+    def subscribe(self, *channels: str):
+        """
+        Subscribes to the messages published on channels from now on. The subscription's get(timeout) returns the next
+        message, or None if there was none within timeout seconds. Close it when done.
+        """
+        return self.backend.subscribe(*channels)
+
+    def fanout(self, pattern: str) -> Fanout:
+        """
+        The process' Fanout for pattern (a glob, ie 'status:changed:*'). Subscribe through it rather than with
+        subscribe when a process has many subscribers to channels of the same kind, ie one per open stream.
+        """
+        with self._fanouts_lock:
+            fanout = self._fanouts.get(pattern)
+            if fanout is None:
+                fanout = self._fanouts[pattern] = Fanout(self, pattern)
+            return fanout
+
+
+store = Store()
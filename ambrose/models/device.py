@@ -16,7 +16,7 @@ class Device(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 
     user = db.relationship('User', uselist=False, back_populates='devices')
-    lights = db.relationship('StatusLight', cascade='all, delete, delete-orphan')
+    lights = db.relationship('StatusLight', cascade='all, delete, delete-orphan', order_by='StatusLight.slot')
 
     @classmethod
     def by_id(cls, device_id):
@@ -42,6 +42,12 @@ class Message(db.Model):
     def __str__(self):
         return self.value
 
+    def max_age(self, now: datetime) -> Optional[float]:
+        """
+        How long, in seconds from now, value stays the same. None if it only changes when the message or its task does
+        """
+        return None
+
     @classmethod
     def by_id(cls, message_id: int) -> Optional[Message]:
         return cls.query.get(message_id)
@@ -101,6 +107,8 @@ class DateTimeMessage(Message):
     description = "Datetime"
 
     default_format = '%b %d at %H%M'
+    # directives that change more often than once a minute
+    _sub_minute_directives = ('%S', '%f', '%c', '%X', '%T', '%r', '%s')
 
     message_id = db.Column(db.Integer, db.ForeignKey('message.id'), primary_key=True)
     dateformat = db.Column(db.String, default=default_format)
@@ -119,6 +127,11 @@ class DateTimeMessage(Message):
     def class_variables(cls):
         return super().class_variables() + ['datetime']
 
+    def max_age(self, now: datetime) -> Optional[float]:
+        if any(directive in (self.dateformat or '') for directive in self._sub_minute_directives):
+            return 0
+        return 60 - now.second - now.microsecond / 1e6
+
     def _substitutions(self):
         tz = dateutil.tz.gettz(self.timezone)
         now = datetime.now(tz=tz)
@@ -171,6 +184,9 @@ class RandomMessage(Message):
 
     description = 'Random message'
 
+    # while a device's status is served from a snapshot, the same choice is shown for up to this many seconds
+    choice_max_age = 30
+
     message_id = db.Column(db.Integer, db.ForeignKey('message.id'), primary_key=True)
 
     _messages = db.relationship('RandomMessageChoice', )
@@ -180,6 +196,9 @@ class RandomMessage(Message):
     def class_variables(cls):
         return super().class_variables() + ['message']
 
+    def max_age(self, now: datetime) -> Optional[float]:
+        return self.choice_max_age
+
     def _substitutions(self):
         return {'message': random.choice(self.messages) }
 
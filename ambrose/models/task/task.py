@@ -1,11 +1,20 @@
 from __future__ import annotations
 
+from datetime import datetime, timedelta
 from typing import List, Tuple, Optional, Mapping, Any
 
 from ambrose.models import db
 
 
 class Task(db.Model):
+    # statuses that are expected to change soon, and so are polled at FAST_POLL_INTERVAL
+    TRANSIENT_STATUSES = {'queued', 'inprogress', 'pending_approval'}
+
+    # polling intervals, in seconds. Tasks whose value does not change back off from BASE to MAX
+    FAST_POLL_INTERVAL = 15
+    BASE_POLL_INTERVAL = 60
+    MAX_POLL_INTERVAL = 60 * 60
+
     _registry = {}
     id = db.Column(db.Integer, primary_key=True)
 
@@ -21,6 +30,10 @@ class Task(db.Model):
     last_update = db.Column(db.DateTime)
     has_changed = db.Column(db.Boolean)
     uses_webhook = db.Column(db.Boolean, default=False)
+    # poll the task even if no light, gauge or message displays it
+    always_poll = db.Column(db.Boolean, default=False)
+    next_poll_at = db.Column(db.DateTime)
+    poll_interval = db.Column(db.Integer)
 
     def __init_subclass__(cls, **kwargs):
         idx = cls.__name__.index('Task')
@@ -34,6 +47,15 @@ class Task(db.Model):
     def by_id(cls, task_id: int) -> Optional[Task]:
         return cls.query.get(task_id)
 
+    @classmethod
+    def due_account_ids(cls, now: datetime) -> List[int]:
+        """
+        The ids of the accounts that have at least one task due to be polled
+        """
+        query = db.session.query(cls.account_id).filter(cls.account_id.isnot(None)).filter(
+            db.or_(cls.next_poll_at.is_(None), cls.next_poll_at <= now))
+        return [account_id for (account_id,) in query.distinct()]
+
     @property
     def type(self) -> str:
         return self.__class__.__name__
@@ -57,13 +79,55 @@ class Task(db.Model):
     def prev_value(self) -> str:
         return self._prev_value
 
+    def is_due(self, now: datetime) -> bool:
+        return self.next_poll_at is None or self.next_poll_at <= now
+
+    def schedule_next_poll(self, previous_value: Optional[str], now: datetime):
+        """
+        Schedules the next poll after the task has been polled. Transient statuses are polled quickly, a changed value
+        resets the interval to the base interval and an unchanged value doubles it, up to MAX_POLL_INTERVAL.
+
+        :param previous_value: the task's value before it was polled
+        :param now: when the task was polled
+        """
+        if self.value is not None and self.value.lower() in self.TRANSIENT_STATUSES:
+            interval = self.FAST_POLL_INTERVAL
+        elif self.value != previous_value or not self.poll_interval:
+            interval = self.BASE_POLL_INTERVAL
+        else:
+            interval = min(max(self.poll_interval, self.BASE_POLL_INTERVAL) * 2, self.MAX_POLL_INTERVAL)
+
+        self.defer_poll(interval, now)
+
+    def back_off(self, now: datetime):
+        """
+        Puts off the next poll after polling the task failed, doubling the interval up to MAX_POLL_INTERVAL.
+        """
+        self.defer_poll(min(max(self.poll_interval or 0, self.BASE_POLL_INTERVAL) * 2, self.MAX_POLL_INTERVAL), now)
+
+    def defer_poll(self, interval: int, now: datetime):
+        self.poll_interval = interval
+        self.next_poll_at = now + timedelta(seconds=interval)
+
+    def touch(self, now: Optional[datetime] = None):
+        """
+        Resets the polling schedule, making the task due right away. Used when something (a webhook, a user) shows
+        interest in the task.
+        """
+        self.poll_interval = self.BASE_POLL_INTERVAL
+        self.next_poll_at = now if now else datetime.now()
+
     __mapper_args__ = {
         'polymorphic_identity': 'task',
         'polymorphic_on': _type
     }
 
     def update(self, data: Mapping[str, Any]):
-        pass
+        always_poll = data.get('always_poll', self.always_poll)
+        if always_poll and not self.always_poll:
+            # the task may have been put off while nothing displayed it
+            self.touch()
+        self.always_poll = always_poll
 
 
 class StatusTask:
@@ -3,3 +3,5 @@ from .user import UserService
 from .auth import AuthService, UserCredentialMismatchException, jwt
 from .accounts import AccountService, GitHubAccountService, ApplicationInsightsAccountService, DevOpsAccountService, WebAccountService
 from .lights import LightService
+from .polling import AccountPoller, PollReport, poll_offset
+from .status import StatusService, StatusSnapshot
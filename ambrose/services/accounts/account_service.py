@@ -1,9 +1,10 @@
-from typing import Type, Optional, AnyStr
+from datetime import datetime
+from typing import Type, Optional, AnyStr, List, Set
 
 from cryptography.fernet import Fernet
 
 from ambrose.common import db_transaction
-from ambrose.models import Account, User
+from ambrose.models import db, Account, User, Task, StatusLight, Gauge, TaskMessage
 from ambrose.services import UnauthorizedAccessException
 
 
@@ -27,6 +28,7 @@ class AccountService:
     def __init__(self, account: Optional[Account], cipher: Optional[Fernet] = None):
         self.cipher = cipher
         self.account = account
+        self._tasks_to_poll = None
 
     def _encrypt(self, token: str) -> str:
         return self.cipher.encrypt(token.encode('utf-8')).decode('utf-8')
@@ -44,9 +46,64 @@ class AccountService:
 
         return account
 
+    def observed_task_ids(self) -> Set[int]:
+        """
+        The ids of this account's tasks that are displayed somewhere - on a device light, a gauge or a task message.
+        """
+        observed = set()
+        for model in (StatusLight, Gauge, TaskMessage):
+            query = db.session.query(model.task_id).join(Task, Task.id == model.task_id)
+            observed.update(task_id for (task_id,) in query.filter(Task.account_id == self.account.id))
+
+        return observed
+
+    @property
+    def tasks_to_poll(self) -> List[Task]:
+        """
+        The tasks that are due and worth polling: those that are displayed somewhere, or that are marked always_poll.
+        Nothing looks at the rest, so they are skipped.
+        """
+        if self._tasks_to_poll is None:
+            now = datetime.now()
+            observed = self.observed_task_ids()
+            self._tasks_to_poll = [t for t in self.account.tasks
+                                   if (t.always_poll or t.id in observed) and t.is_due(now)]
+
+        return self._tasks_to_poll
+
     def get_task_statuses(self):
         pass
 
+    def poll(self):
+        """
+        Polls the tasks that are due, then schedules their next poll based on how their values changed.
+        Due tasks that are not displayed anywhere are put off for the maximum interval - they are touched again when
+        they are added to a light, gauge or message.
+
+        If fetching the statuses fails, the due tasks back off before the error is raised, so that a failing account
+        isn't retried on every cycle.
+        """
+        tasks = self.tasks_to_poll
+        previous_values = {t.id: t.value for t in tasks}
+
+        try:
+            if len(tasks) > 0:
+                self.get_task_statuses()
+        except Exception:
+            now = datetime.now()
+            with db_transaction():
+                for task in tasks:
+                    task.back_off(now)
+            raise
+
+        now = datetime.now()
+        with db_transaction():
+            for task in self.account.tasks:
+                if task.id in previous_values:
+                    task.schedule_next_poll(previous_values[task.id], now)
+                elif task.is_due(now):
+                    task.defer_poll(Task.MAX_POLL_INTERVAL, now)
+
     @classmethod
     def create_account(cls, account_type: str, cipher: Fernet, user: User, *args, **kwargs) -> Account:
         service_type = cls._registry[account_type.lower()]
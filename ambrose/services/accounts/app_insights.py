@@ -3,7 +3,7 @@ from datetime import datetime
 from ambrose.common import db_transaction
 from ambrose.models import ApplicationInsightsAccount, ApplicationInsightsMetricTask
 from .account_service import AccountService
-from application_insights import ApplicationInsightsService
+from application_insights import ApplicationInsightsService, MetricQuery
 
 
 class ApplicationInsightsAccountService(AccountService, model=ApplicationInsightsAccount):
@@ -22,20 +22,27 @@ class ApplicationInsightsAccountService(AccountService, model=ApplicationInsight
             if len([c for c in api_key if c != '*']) > 0:
                 self.account.api_key = self._encrypt(api_key)
 
-    def add_metric(self, metric: str, nickname: str, aggregation: str, timespan: str):
+    def add_metric(self, metric: str, nickname: str, aggregation: str, timespan: str, always_poll: bool = False):
         with db_transaction():
             self.account.add_task(ApplicationInsightsMetricTask(
                 metric=metric,
                 nickname=nickname,
                 aggregation=aggregation,
-                timespan=timespan
+                timespan=timespan,
+                always_poll=always_poll
             ))
 
     def get_task_statuses(self):
+        tasks = [t for t in self.tasks_to_poll if isinstance(t, ApplicationInsightsMetricTask)]
+        if len(tasks) == 0:
+            return
+
         insights = ApplicationInsightsService(self.account.application_id, self._decrypt(self.account.api_key))
+        metrics = insights.get_metrics(MetricQuery(str(t.id), t.metric, t.aggregation, t.timespan) for t in tasks)
+
         with db_transaction():
-            for task in [t for t in self.account.tasks if isinstance(t, ApplicationInsightsMetricTask)]:
-                metric = insights.get_metric(task.metric, aggregation=task.aggregation, timespan=task.timespan)
+            for task in tasks:
+                metric = metrics.get(str(task.id))
                 if metric:
                     task.last_update = datetime.now()
                     task.value = metric.value
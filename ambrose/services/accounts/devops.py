@@ -1,12 +1,24 @@
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent import futures
 from datetime import datetime
-from typing import Set, List, Mapping, Any, Tuple, Iterable
+from typing import Set, List, Mapping, Any, Iterable, Optional, Callable, Dict
 
-from ambrose.common import db_transaction
+from ambrose.common import db_transaction, store
 from ambrose.models import DevOpsAccount, DevOpsReleaseTask, DevOpsBuildTask
 from ambrose.services import NotFoundException, UnauthorizedAccessException
 from ambrose.services.accounts import AccountService
 from devops import DevOpsService
 
+logger = logging.getLogger(__name__)
+
+# incomplete lists the projects whose definitions could not be fetched in time
+DevOpsTaskList = namedtuple('DevOpsTaskList', 'builds releases incomplete')
+
 
 class BuildTask:
     def __init__(self, project, definition_id, **kwargs):
@@ -84,59 +96,170 @@ class DevOpsAccountService(AccountService, model=DevOpsAccount):
         token = self._decrypt(self.account.token)
         return DevOpsService(self.account.username, token, self.account.organization)
 
-    def list_all_tasks(self) -> Tuple[List[BuildTask], List[ReleaseTask]]:
+    CATALOG_KEY = 'devops:catalog:{}'
+    CATALOG_PROGRESS_KEY = 'devops:catalog:{}:progress'
+
+    def discover_definitions(self, max_workers: int = 8, timeout: float = 120,
+                             on_progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+        """
+        Crawls the organization for its build and release definitions. Only makes requests, so it can run anywhere.
+
+        Projects are fetched concurrently on up to max_workers threads. Whatever hasn't finished timeout seconds after
+        the call started is left out and its project is reported as incomplete.
+
+        :param on_progress: called with the number of requests completed and the total, as they complete
+        :return: the catalog - the discovered builds and releases as dicts of their BuildTask / ReleaseTask arguments,
+        and the incomplete projects
+        """
+        deadline = time.monotonic() + timeout
         service = self.get_service()
         project_list = service.list_projects()
         if not project_list:
-            return [], []  # TODO: raise exception instead
-
-        builds = set()
-        releases = set()
-        for project in [p.name for p in project_list]:
-            builds.update(self._list_builds(service, project))
-            releases.update(self._list_releases(service, project))
-
-        return sorted(builds, key=lambda x: (x.project, x.pipeline)), \
-               sorted(releases, key=lambda x: (x.project, x.pipeline, x.environment))
-
-    def _list_releases(self, service: DevOpsService, project: str) -> Set[ReleaseTask]:
-        release_list = service.list_release_definitions(project)
-        if release_list:
-            releases = set()
-            for release in release_list:
-                for environment in release.environments:
-                    releases.add(ReleaseTask(
-                        project=project,
-                        definition_id=int(release.id),
-                        environment_id=int(environment.id),
-                        pipeline=release.name,
-                        environment=environment.name,
-                        uses_webhook=False
-                    ))
-
-            # get the release tasks that are current (the intersection of the current task and the retrieved tasks
-            # this ensures that current and webhooks are set appropriately
-            # then get the new releases - the new tasks - the current tasks
-            # add the union of these to the releases
-            current_releases = self.release_tasks.intersection(releases)
-            new_releases = releases.difference(current_releases)
-            return current_releases.union(new_releases)
-
-    def _list_builds(self, service: DevOpsService, project: str) -> Set[BuildTask]:
-        build_list = service.list_build_definitions(project)
-        if build_list:
-            builds = set()
-            for build in build_list:
-                builds.add(BuildTask(
-                    project=project,
-                    definition_id=int(build.id),
-                    pipeline=build.name,
-                ))
+            return {'builds': [], 'releases': [], 'incomplete': []}  # TODO: raise exception instead
+        projects = [p.name for p in project_list]
+
+        executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        build_jobs = {executor.submit(self._discover_builds, service, project): project for project in projects}
+        release_jobs = {executor.submit(self._discover_releases, service, project): project for project in projects}
+        jobs = list(build_jobs) + list(release_jobs)
+        if on_progress:
+            completed = itertools.count(1)
+            for job in jobs:
+                job.add_done_callback(lambda _: on_progress(next(completed), len(jobs)))
+        futures.wait(jobs, timeout=max(deadline - time.monotonic(), 0))
+        for job in jobs:
+            job.cancel()
+        executor.shutdown(wait=False)
+
+        builds = []
+        releases = []
+        incomplete = set()
+
+        for job, project in build_jobs.items():
+            project_builds = self._job_result(job, project)
+            if project_builds is None:
+                incomplete.add(project)
+            else:
+                builds.extend(project_builds)
+
+        for job, project in release_jobs.items():
+            project_releases = self._job_result(job, project)
+            if project_releases is None:
+                incomplete.add(project)
+            else:
+                releases.extend(project_releases)
+
+        return {'builds': builds, 'releases': releases, 'incomplete': sorted(incomplete)}
+
+    def tasks_from_catalog(self, catalog: Mapping[str, Any]) -> DevOpsTaskList:
+        """
+        Merges a catalog with the account's current tasks. The monitored tasks of incomplete projects are listed even
+        if the catalog doesn't have them, so submitting the list doesn't remove them.
+        """
+        current_builds = self.build_tasks
+        current_releases = self.release_tasks
+        builds = {BuildTask(**t) for t in catalog['builds']}
+        releases = {ReleaseTask(**t) for t in catalog['releases']}
+        incomplete = set(catalog['incomplete'])
+
+        # use the current tasks where they were retrieved, so current and webhooks are set appropriately
+        builds = {t for t in current_builds if t in builds or t.project in incomplete}.union(builds)
+        releases = {t for t in current_releases if t in releases or t.project in incomplete}.union(releases)
+
+        return DevOpsTaskList(sorted(builds, key=lambda x: (x.project, x.pipeline)),
+                              sorted(releases, key=lambda x: (x.project, x.pipeline, x.environment)),
+                              sorted(incomplete))
+
+    def cached_catalog(self) -> Optional[Dict[str, Any]]:
+        catalog = store.get(self.CATALOG_KEY.format(self.account.id))
+        return json.loads(catalog) if catalog else None
+
+    @staticmethod
+    def is_stale(catalog: Mapping[str, Any], ttl: float, now: Optional[datetime] = None) -> bool:
+        """
+        Whether the catalog was refreshed more than ttl seconds ago. A stale catalog is still shown, while it is
+        refreshed in the background.
+        """
+        refreshed_at = catalog.get('refreshed_at')
+        if refreshed_at is None:
+            return True
+        return ((now or datetime.now()) - datetime.fromisoformat(refreshed_at)).total_seconds() > ttl
+
+    def catalog_progress(self) -> Optional[Dict[str, int]]:
+        """
+        :return: the progress of the refresh in progress, if any, as the number of requests done and the total
+        """
+        progress = store.get(self.CATALOG_PROGRESS_KEY.format(self.account.id))
+        return json.loads(progress) if progress else None
+
+    def start_catalog_refresh(self, ttl: float) -> bool:
+        """
+        Marks a catalog refresh as started, unless one already is. The mark expires after ttl seconds, in case the
+        refresh never finishes.
+
+        :return: True if the caller should run (or queue) the refresh
+        """
+        return store.add(self.CATALOG_PROGRESS_KEY.format(self.account.id), json.dumps({'done': 0, 'total': 0}), ttl)
+
+    def refresh_catalog(self, max_workers: int = 8, timeout: float = 120):
+        """
+        Discovers the account's definitions and caches the catalog, with the time it was refreshed at. The catalog
+        doesn't expire, so the page always has one to show - see is_stale. Projects that don't finish keep what the
+        previous catalog had for them.
+        """
+        progress_key = self.CATALOG_PROGRESS_KEY.format(self.account.id)
+        # requests still running after the timeout complete later, and shouldn't mark the refresh as running again
+        finished = threading.Event()
+
+        def on_progress(done: int, total: int):
+            if not finished.is_set():
+                store.set(progress_key, json.dumps({'done': done, 'total': total}), timeout + 60)
+
+        try:
+            catalog = self.discover_definitions(max_workers, timeout, on_progress)
+
+            previous = self.cached_catalog()
+            if previous and catalog['incomplete']:
+                incomplete = set(catalog['incomplete'])
+                catalog['builds'] += [t for t in previous['builds'] if t['project'] in incomplete]
+                catalog['releases'] += [t for t in previous['releases'] if t['project'] in incomplete]
+
+            catalog['refreshed_at'] = datetime.now().isoformat()
+            store.set(self.CATALOG_KEY.format(self.account.id), json.dumps(catalog))
+        finally:
+            finished.set()
+            store.delete(progress_key)
+
+    @staticmethod
+    def _discover_builds(service: DevOpsService, project: str) -> List[Dict[str, Any]]:
+        # the definitions are consumed as each page arrives, and pages aren't cached, so only the fields kept in the
+        # catalog are held on to
+        return [{'project': project, 'definition_id': int(build.id), 'pipeline': build.name}
+                for build in service.list_build_definitions(project)]
+
+    @staticmethod
+    def _discover_releases(service: DevOpsService, project: str) -> List[Dict[str, Any]]:
+        return [{
+            'project': project,
+            'definition_id': int(release.id),
+            'environment_id': int(environment.id),
+            'pipeline': release.name,
+            'environment': environment.name,
+            'uses_webhook': False
+        } for release in service.list_release_definitions(project) for environment in release.environments]
+
+    @staticmethod
+    def _job_result(job: 'futures.Future[List[Dict[str, Any]]]', project: str) -> Optional[List[Dict[str, Any]]]:
+        if job.cancelled() or not job.done():
+            logger.warning('Listing definitions for project %s timed out', project)
+            return None
 
-            # same process as with releases
-            current_builds = self.build_tasks.intersection(builds)
-            new_builds = builds.difference(current_builds)
-            return current_builds.union(new_builds)
+        error = job.exception()
+        if error is not None:
+            logger.warning('Listing definitions for project %s failed: %s', project, error)
+            return None
+
+        return job.result()
 
     def get_task_statuses(self):
         with db_transaction():
@@ -144,7 +267,7 @@ class DevOpsAccountService(AccountService, model=DevOpsAccount):
             self.update_release_statuses()
 
     def update_build_statuses(self):
-        builds = self.account.build_tasks
+        builds = [t for t in self.tasks_to_poll if isinstance(t, DevOpsBuildTask)]
         service = self.get_service()
 
         with db_transaction():
@@ -160,14 +283,30 @@ class DevOpsAccountService(AccountService, model=DevOpsAccount):
 
     def update_release_statuses(self):
         # filter out the releases that use web hooks
-        releases = [r for r in self.account.release_tasks if not r.uses_webhook or r.status.lower() == 'queued' or r.status.lower() == 'canceled']
+        releases = [r for r in self.tasks_to_poll if isinstance(r, DevOpsReleaseTask) and
+                    (not r.uses_webhook or r.status.lower() == 'queued' or r.status.lower() == 'canceled')]
         service = self.get_service()
 
         with db_transaction():
-            for (project, definition) in {(t.project, t.definition_id) for t in releases}:
+            # one listing per project covers every definition that has been deployed recently
+            uncovered = []
+            for project in {t.project for t in releases}:
+                release_list = service.list_releases(project)
+                update_time = datetime.now()
+                for env in [r for r in releases if r.project == project]:
+                    if release_list is None or not release_list.covers(env.definition_id, env.environment_id):
+                        uncovered.append(env)
+                        continue
+                    env.status = release_list.status_for_environment(env.environment_id, env.definition_id)
+                    env.last_update = update_time
+
+            # definitions that haven't been deployed within the listing fall back to their own summary
+            for (project, definition) in {(t.project, t.definition_id) for t in uncovered}:
                 statuses = service.get_release_summary(project, definition)
+                if statuses is None:
+                    continue
                 update_time = datetime.now()
-                for env in [r for r in releases if r.project == project and r.definition_id == definition]:
+                for env in [r for r in uncovered if r.project == project and r.definition_id == definition]:
                     env.status = statuses.status_for_environment(env.environment_id)
                     env.last_update = update_time
 
@@ -183,6 +322,7 @@ class DevOpsAccountService(AccountService, model=DevOpsAccount):
         with db_transaction():
             task.status = updates.status
             task.last_update = datetime.now()
+            task.touch(task.last_update)
 
     def get_release_task(self, project_id: str, definition_id: str, environment_id: str):
         matches = [t for t in self.account.release_tasks if t.project == project_id and t.definition_id == definition_id and t.environment_id == int(environment_id)]
@@ -1,12 +1,11 @@
 from datetime import datetime
-from typing import Mapping, Any
-
-from github import Github
+from typing import Mapping, Any, Iterable
 
 from ambrose.common import db_transaction
 from ambrose.models import GitHubAccount, GitHubRepositoryStatusTask
 from ambrose.services import NotFoundException, UnauthorizedAccessException
 from ambrose.services.accounts import AccountService
+from github_graphql import GitHubGraphQLService, PullRequestStatus
 
 
 class GitHubAccountService(AccountService, model=GitHubAccount):
@@ -20,50 +19,47 @@ class GitHubAccountService(AccountService, model=GitHubAccount):
             if len([c for c in token if c != '*']) > 0:
                 self.account.token = self._encrypt(token)
 
-    def add_repo_task(self, repo_name: str, nickname: str):
+    def add_repo_task(self, repo_name: str, nickname: str, always_poll: bool = False):
         owner, name = repo_name.split('/')
 
         with db_transaction():
-            self.account.add_task(GitHubRepositoryStatusTask(owner=owner, repo_name=name))
+            self.account.add_task(GitHubRepositoryStatusTask(owner=owner, repo_name=name, always_poll=always_poll))
 
     def get_task_statuses(self, update_all=False):
         if update_all:
             tasks_requiring_updates = self.account.tasks
         else:
-            tasks_requiring_updates = [t for t in self.account.tasks if not t.uses_webhook]
+            tasks_requiring_updates = [t for t in self.tasks_to_poll if not t.uses_webhook]
 
         if len(tasks_requiring_updates) == 0:
             return
 
-        github_user = Github(self._decrypt(self.account.token)).get_user()
+        service = GitHubGraphQLService(self._decrypt(self.account.token))
+        statuses = service.get_repository_statuses((t.owner, t.repo_name) for t in tasks_requiring_updates)
 
         with db_transaction():
             for task in tasks_requiring_updates:
-                if task.owner == github_user.login:
-                    repo = github_user.get_repo(task.repo_name)
-                else:
-                    org = [org for org in github_user.get_orgs() if org.login == task.owner][0]
-                    repo = org.get_repo(task.repo_name)
+                repo = statuses.get((task.owner, task.repo_name))
+                if repo is None:
+                    continue
 
-                prs = list(repo.get_pulls())
                 task.last_update = datetime.now()
-                task.pr_count = len(prs)
+                task.pr_count = repo.pr_count
 
-                if len(prs) == 0:
+                if repo.pr_count == 0:
                     task.status = 'no_open_prs'
                 else:
-                    task.status = self._status_for_prs(prs)
+                    task.status = self._status_for_prs(repo.pull_requests)
 
-    def _status_for_prs(self, prs):
+    def _status_for_prs(self, prs: Iterable[PullRequestStatus]) -> str:
         prs_need_review = False
         for pr in prs:
             if not pr.mergeable:
                 return 'prs_with_issues'
 
-            reviews = list(pr.get_reviews())
-            if 'CHANGES_REQUESTED' in [review.state for review in reviews]:
+            if pr.changes_requested:
                 return 'prs_with_issues'
-            if len(reviews) == 0:
+            if pr.review_count == 0:
                 prs_need_review = True
 
         return 'prs_need_review' if prs_need_review else 'open_prs'
@@ -78,6 +74,9 @@ class GitHubAccountService(AccountService, model=GitHubAccount):
 
         action = data['action']
 
+        with db_transaction():
+            task.touch()
+
         # there are some that we don't care about - just ignore them
         unwatched_actions = ['assigned', 'unassigned', 'review_requested', 'review_requested_removed', 'labeled', 'unlabeled', 'ready_for_review', 'locked', 'unlocked']
         if action in unwatched_actions:
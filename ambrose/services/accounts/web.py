@@ -4,26 +4,39 @@ import requests
 
 from ambrose.models import WebAccount, HealthcheckTask
 from ambrose.common import db_transaction
+from http_client import HTTPClient
 from . import AccountService
 
 
 class WebAccountService(AccountService, model=WebAccount):
+    # shared by all instances, so connections to the same site are reused across accounts
+    client = HTTPClient('healthcheck', retries=1)
+
     def _new_account(self, base_url: str, nickname: str) -> WebAccount:
         return WebAccount(base_url=base_url, nickname=nickname)
 
-    def add_healthcheck(self, path: str):
+    def add_healthcheck(self, path: str, always_poll: bool = False):
         with db_transaction():
-            self.account.add_task(HealthcheckTask(path=path))
+            self.account.add_task(HealthcheckTask(path=path, always_poll=always_poll))
 
     def get_task_statuses(self):
-        for task in self.account.tasks:
+        for task in self.tasks_to_poll:
             if isinstance(task, HealthcheckTask):
-                url = self.account.base_url + task.path
-                res = requests.get(url)
+                status = self.check(self.account.base_url + task.path)
 
                 with db_transaction():
-                    if 200 <= res.status_code < 400:
-                        task.status = "healthy"
-                    else:
-                        task.status = "not-healthy"
-                    task.last_update = datetime.now()
\ No newline at end of file
+                    task.status = status
+                    task.last_update = datetime.now()
+
+    def check(self, url: str) -> str:
+        try:
+            # a 304 means the page hasn't changed since it was last healthy
+            return self.client.get_cached(url, self._status_for_response)
+        except requests.RequestException:
+            return "not-healthy"
+
+    @staticmethod
+    def _status_for_response(res: requests.Response) -> str:
+        if 200 <= res.status_code < 400:
+            return "healthy"
+        return "not-healthy"
@@ -4,7 +4,10 @@ from typing import Callable, Optional, Union
 
 import flask_bcrypt as bcrypt
 import flask_login
-from flask_jwt_extended import get_jwt_identity, create_access_token, JWTManager, get_current_user
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity, create_access_token, JWTManager, get_current_user, decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
 
 from ambrose.models import User, Device
 from ambrose.services import UserService
@@ -79,6 +82,30 @@ class AuthService:
     def current_api_user(cls) -> Optional[User]:
         return get_current_user()
 
+    @classmethod
+    def token_identity(cls) -> Optional[str]:
+        """
+        The identity of the access token in the request's headers, verified but without loading the user or device it
+        belongs to. None if the request has no valid access token
+        """
+        config = current_app.config
+        header = request.headers.get(config['JWT_HEADER_NAME'], '').split()
+        header_type = config['JWT_HEADER_TYPE']
+        if header_type:
+            if len(header) != 2 or header[0] != header_type:
+                return None
+        elif len(header) != 1:
+            return None
+
+        try:
+            token = decode_token(header[-1])
+        except (JWTExtendedException, PyJWTError):
+            return None
+
+        if token.get('type') != 'access':
+            return None
+        return token.get(config['JWT_IDENTITY_CLAIM'])
+
     @classmethod
     def jwt(cls, entity: Union[User, Device]):
         return create_access_token(identity=entity)
@@ -0,0 +1,160 @@
+import logging
+import random
+import threading
+import time
+import zlib
+from collections import namedtuple
+from concurrent import futures
+from typing import Iterable, List, Mapping, Tuple
+
+from cryptography.fernet import Fernet
+from flask import Flask
+
+from ambrose.common import single_flight, metrics
+from ambrose.models import db, Account
+from .accounts import AccountService
+
+logger = logging.getLogger(__name__)
+
+AccountPollResult = namedtuple('AccountPollResult', 'account_id provider duration error skipped')
+
+
+def poll_offset(account_id: int, window: float, jitter: float = 0.0) -> float:
+    """
+    How long after the start of a cycle an account should be polled. Accounts are spread evenly across the window by
+    a hash of their id, so each account keeps the same slot from cycle to cycle, plus up to jitter seconds of random
+    delay so accounts that share a slot do not fire together.
+
+    :param account_id: the account being scheduled
+    :param window: the length of the cycle, in seconds
+    :param jitter: the maximum random delay, in seconds
+    :return: the offset, in seconds
+    """
+    slot = zlib.crc32(str(account_id).encode('utf-8')) / 0x100000000
+    return slot * window + random.uniform(0, jitter)
+
+
+class PollReport:
+    """
+    Summary of a single poll cycle. account_time is the sum of the time spent polling each account, which, compared
+    to wall_time, shows how much the cycle gained from polling concurrently.
+    """
+
+    def __init__(self, results: List[AccountPollResult], wall_time: float):
+        self.results = results
+        self.wall_time = wall_time
+
+    @property
+    def account_time(self) -> float:
+        return sum(r.duration for r in self.results)
+
+    @property
+    def failures(self) -> List[AccountPollResult]:
+        return [r for r in self.results if r.error is not None]
+
+    @property
+    def skipped(self) -> List[AccountPollResult]:
+        return [r for r in self.results if r.skipped]
+
+    @property
+    def speedup(self) -> float:
+        return self.account_time / self.wall_time if self.wall_time > 0 else 0.0
+
+    def __str__(self):
+        return 'Polled {} accounts ({} failed, {} skipped) in {:.2f}s wall time, {:.2f}s account time ({:.1f}x)'.format(
+            len(self.results), len(self.failures), len(self.skipped), self.wall_time, self.account_time, self.speedup)
+
+
+class AccountPoller:
+    """
+    Polls accounts concurrently on a bounded thread pool.
+
+    Each account is polled on its own worker thread, inside its own app context and therefore with its own DB session,
+    so one account failing (or leaving its session in a bad state) does not affect the others. Providers can be given
+    a lower concurrency limit than the pool size, keyed by the account's polymorphic type (ie 'github_account'), to
+    stay within upstream rate limits.
+
+    An account is only polled by one poller at a time. If another poll of the account is still in flight (ie, from a
+    previous cycle that overran), the account is skipped and the in-flight poll's results serve both cycles.
+    """
+
+    def __init__(self, app: Flask, cipher: Fernet, max_workers: int = 8, provider_limits: Mapping[str, int] = None,
+                 lock_ttl: float = 60):
+        self.app = app
+        self.cipher = cipher
+        self.max_workers = max_workers
+        self.lock_ttl = lock_ttl
+        self._limits = {provider: threading.BoundedSemaphore(limit)
+                        for provider, limit in (provider_limits or {}).items()}
+
+    @classmethod
+    def from_config(cls, app: Flask, cipher: Fernet) -> 'AccountPoller':
+        return cls(app, cipher,
+                   max_workers=app.config.get('POLLING_MAX_WORKERS', 8),
+                   provider_limits=app.config.get('POLLING_PROVIDER_LIMITS'),
+                   lock_ttl=app.config.get('POLLING_ACCOUNT_LOCK_TTL', 60))
+
+    def poll_all(self) -> PollReport:
+        return self._poll(db.session.query(Account.id, Account.type).all())
+
+    def poll(self, account_ids: Iterable[int]) -> PollReport:
+        account_ids = list(account_ids)
+        if len(account_ids) == 0:
+            return PollReport([], 0.0)
+
+        return self._poll(db.session.query(Account.id, Account.type).filter(Account.id.in_(account_ids)).all())
+
+    def _poll(self, accounts: List[Tuple[int, str]]) -> PollReport:
+        start = time.perf_counter()
+
+        executor = futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        jobs = [executor.submit(self._poll_account, account_id, provider) for account_id, provider in accounts]
+        try:
+            results = [job.result() for job in jobs]
+        except BaseException:
+            # most likely a time limit - don't start any accounts that are still waiting for a worker
+            for job in jobs:
+                job.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=False)
+
+        report = PollReport(results, time.perf_counter() - start)
+        logger.info(str(report))
+        return report
+
+    def _poll_account(self, account_id: int, provider: str) -> AccountPollResult:
+        with single_flight('poll:account:{}'.format(account_id), self.lock_ttl) as acquired:
+            if not acquired:
+                metrics.incr('poll.account.skipped')
+                return AccountPollResult(account_id, provider, 0.0, None, True)
+
+            limit = self._limits.get(provider)
+            if limit:
+                limit.acquire()
+
+            start = time.perf_counter()
+            error = None
+            try:
+                with self.app.app_context():
+                    try:
+                        self._poll_in_context(account_id)
+                    except Exception as e:
+                        db.session.rollback()
+                        logger.exception('Polling account %s failed', account_id)
+                        metrics.incr('poll.account.failed')
+                        error = e
+                    finally:
+                        db.session.remove()
+            finally:
+                if limit:
+                    limit.release()
+
+            return AccountPollResult(account_id, provider, time.perf_counter() - start, error, False)
+
+    def _poll_in_context(self, account_id: int):
+        account = Account.by_id(account_id)
+        if account is None:
+            return
+
+        AccountService(account, self.cipher).poll()
@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import random
+from collections import namedtuple
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ambrose.common import store
+from ambrose.models import Device, User, Task, StatusLight, Message, RandomMessageChoice, TaskMessage
+from .lights import LightService
+
+logger = logging.getLogger(__name__)
+
+# attributes that change without changing what any device shows
+_IGNORED_ATTRIBUTES = {
+    Task: {'next_poll_at', 'poll_interval', 'always_poll'},
+    Device: {'last_contact'},
+}
+
+StatusSnapshot = namedtuple('StatusSnapshot', 'etag body')
+
+# session.info key for the ids of the users whose status is changed by the session's current transaction
+_PENDING_USERS = 'status_users'
+
+
+class StatusService:
+    """
+    Builds the status document that a device polls from /api/status, and keeps a serialized snapshot of it per device
+    so that polls are answered from the store without touching the database while nothing has changed.
+
+    Every snapshot is tagged with its user's status version. The version is bumped after any commit that changes
+    something a status is built from (a task, light, setting, message or gauge), whether it comes from the poller, a
+    webhook or the web UI, and a snapshot is only served while its version is current.
+
+    Snapshots also carry an ETag of the body, so a device that already has the current status is answered with a 304.
+    Version changes are also published, for the devices that are pushed their status instead of polling for it.
+
+    Recently served statuses are kept for a while by ETag, so a device can be sent just what changed since the status
+    it has.
+    """
+    SNAPSHOT_KEY = 'status:snapshot:{}'
+    VERSION_KEY = 'status:version:{}'
+    # recently served statuses, by device and ETag, that devices can ask for the changes since
+    HISTORY_KEY = 'status:history:{}:{}'
+    # the new version is published here whenever a user's status changes
+    CHANGED_CHANNEL = 'status:changed:{}'
+    # all the users' channels, which each process subscribes to once
+    CHANGED_PATTERN = 'status:changed:*'
+
+    # called with the ids of the users whose status changed, after the change is committed. They run within the
+    # commit, so they shouldn't touch the database
+    change_listeners: List[Callable[[Set[int]], None]] = []
+
+    def __init__(self, device: Device):
+        self.device = device
+        self.user = device.user
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "lights": LightService(self.user.light_settings).lights_for_device(self.device),
+            "messages": [m.value for m in self.user.messages],
+            'gauges': self.user.gauges
+        }
+
+    def max_age(self, ttl: float, now: Optional[datetime] = None) -> float:
+        """
+        How long the current status can be served for: ttl, or less if a message shows the time or a random choice
+        """
+        now = now or datetime.now()
+        ages = (message.max_age(now) for message in self.user.messages)
+        return min([ttl] + [age for age in ages if age is not None])
+
+    @staticmethod
+    def etag(body: str) -> str:
+        return hashlib.blake2b(body.encode('utf-8'), digest_size=12).hexdigest()
+
+    def save_snapshot(self, version: str, snapshot: StatusSnapshot, ttl: float):
+        """
+        :param version: the user's status version from before the status was built
+        """
+        if ttl > 0:
+            store.set(self.SNAPSHOT_KEY.format(self.device.device_uuid),
+                      '{}:{}:{}:{}'.format(self.user.id, version, snapshot.etag, snapshot.body), ttl)
+
+    def save_history(self, snapshot: StatusSnapshot, ttl: float):
+        if ttl > 0:
+            store.set(self.HISTORY_KEY.format(self.device.device_uuid, snapshot.etag), snapshot.body, ttl)
+
+    @classmethod
+    def previous(cls, device_uuid: str, etag: str) -> Optional[str]:
+        """
+        :return: the serialized status the device was served with the ETag, if it is still kept
+        """
+        return store.get(cls.HISTORY_KEY.format(device_uuid, etag))
+
+    @classmethod
+    def snapshot(cls, device_uuid: str) -> Optional[StatusSnapshot]:
+        """
+        :return: the device's serialized status, if it has a snapshot that is still current
+        """
+        snapshot = store.get(cls.SNAPSHOT_KEY.format(device_uuid))
+        if snapshot is None:
+            return None
+
+        user_id, version, etag, body = snapshot.split(':', 3)
+        if store.get(cls.VERSION_KEY.format(user_id)) != version:
+            return None
+        return StatusSnapshot(etag, body)
+
+    @classmethod
+    def version(cls, user_id: int) -> str:
+        key = cls.VERSION_KEY.format(user_id)
+        version = store.get(key)
+        if version is None:
+            # start from a random version, so that if the counter is ever lost, the restarted counter can't match the
+            # versions of old snapshots
+            store.add(key, str(random.getrandbits(48)))
+            version = store.get(key)
+        return version
+
+    @classmethod
+    def invalidate(cls, user_ids: Iterable[int]):
+        user_ids = set(user_ids)
+        for user_id in user_ids:
+            version = store.incr(cls.VERSION_KEY.format(user_id))
+            store.publish(cls.CHANGED_CHANNEL.format(user_id), version)
+
+        for listener in cls.change_listeners:
+            try:
+                listener(user_ids)
+            except Exception:
+                # the change is already committed, so a failing listener must not fail the request that made it
+                logger.exception('Status change listener %s failed', listener)
+
+    @classmethod
+    def changes(cls, user_id: int):
+        """
+        A store subscription that receives the user's new status version each time it changes. Subscriptions share
+        the process' one subscription to every user's changes, so an open stream doesn't hold a connection of its own
+        """
+        return store.fanout(cls.CHANGED_PATTERN).subscribe(cls.CHANGED_CHANNEL.format(user_id))
+
+
+def _owner(session: Session, obj) -> Optional[int]:
+    """
+    The id of the user whose status obj is part of, or None if it isn't part of any
+    """
+    if isinstance(obj, User):
+        return obj.id
+    if isinstance(obj, StatusLight):
+        return session.query(Device.user_id).filter_by(id=obj.device_id).scalar()
+    if isinstance(obj, RandomMessageChoice):
+        return session.query(Message.user_id).filter_by(id=obj.message_id).scalar()
+    # new objects added through one of the user's collections don't have a user_id yet, but the user is then changed
+    # as well
+    return getattr(obj, 'user_id', None)
+
+
+def _shows_last_update(session: Session, task: Task) -> bool:
+    query = session.query(TaskMessage.message_id).filter(TaskMessage.task_id == task.id,
+                                                         TaskMessage.text.contains('{last_update'))
+    return query.first() is not None
+
+
+def _is_changed(session: Session, obj) -> bool:
+    ignored = next((attrs for cls, attrs in _IGNORED_ATTRIBUTES.items() if isinstance(obj, cls)), ())
+    changed = {attr.key for attr in inspect(obj).attrs if attr.key not in ignored and attr.history.has_changes()}
+    # every poll sets last_update, but it only changes what a device shows if a task message displays it
+    if isinstance(obj, Task) and 'last_update' in changed and not _shows_last_update(session, obj):
+        changed.discard('last_update')
+    return bool(changed)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_changed_users(session: Session, flush_context, instances):
+    users = session.info.setdefault(_PENDING_USERS, set())
+    with session.no_autoflush:
+        for obj in session.new | session.deleted:
+            users.add(_owner(session, obj))
+        for obj in session.dirty:
+            if _is_changed(session, obj):
+                users.add(_owner(session, obj))
+    users.discard(None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session: Session):
+    users = session.info.pop(_PENDING_USERS, None)
+    if users:
+        StatusService.invalidate(users)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session: Session):
+    session.info.pop(_PENDING_USERS, None)
@@ -3,7 +3,7 @@ from typing import Any, Mapping, List
 
 import flask_bcrypt as bcrypt
 
-from ambrose.common import db_transaction
+from ambrose.common import db_transaction, mqtt
 from ambrose.models import User, DateTimeMessage, TextMessage, TaskMessage, Message, Device, Task, Gauge, LightSettings
 from ambrose.services import UnauthorizedAccessException
 
@@ -40,6 +40,8 @@ class UserService:
             for light_data in data['lights']:
                 task_id = light_data['task']
                 task = Task.by_id(task_id) if task_id >= 0 else None
+                if task:
+                    task.touch()
                 device.set_task_for_light(task, light_data['slot'])
 
     def add_datetime_message(self, format_string: str, date_format: str, timezone: str) -> Message:
@@ -51,6 +53,8 @@ class UserService:
 
     def add_task_message(self, task_id: int, format_string: str) -> Message:
         task = Task.by_id(task_id)
+        if task:
+            task.touch()
         return self._add_message(TaskMessage(text=format_string, task=task))
 
     def get_message(self, message_id: int) -> Message:
@@ -68,7 +72,10 @@ class UserService:
             message.update(data)
 
     def create_message(self, message_type: str, data: Mapping[str, Any]):
-        return self._add_message(Message.new_message(message_type, data))
+        message = Message.new_message(message_type, data)
+        if isinstance(message, TaskMessage) and message.task_id is not None:
+            self.touch_tasks([Task.by_id(message.task_id)])
+        return self._add_message(message)
 
     def delete_message(self, message_id: int):
         self._delete(self.get_message(message_id))
@@ -92,6 +99,9 @@ class UserService:
 
     def add_gauge(self, task_id: int, min_val: int, max_val: int, nickname: str):
         with db_transaction():
+            task = Task.by_id(task_id)
+            if task:
+                task.touch()
             self.user.add_gauge(Gauge(min_val=min_val, max_val=max_val, task_id=task_id, nickname=nickname))
 
     def add_device(self, name: str, lights: int, gauges: int, supports_messages: bool) -> Device:
@@ -108,7 +118,22 @@ class UserService:
         return device
 
     def delete_device(self, device_id):
-        self._delete(self.get_device(device_id))
+        device = self.get_device(device_id)
+        device_uuid = device.device_uuid
+        self._delete(device)
+        if mqtt.enabled:
+            mqtt.clear_status(device_uuid)
+
+    def touch_tasks(self, tasks: List[Task]):
+        """
+        Makes the tasks due for polling right away, ie because the user is looking at them. Tasks that are already due
+        are left alone, so their schedule isn't written again.
+        """
+        now = datetime.datetime.now()
+        with db_transaction():
+            for task in tasks:
+                if task in self.user.tasks and not task.is_due(now):
+                    task.touch(now)
 
     def mark_tasks_viewed(self):
         with db_transaction():
@@ -122,6 +147,13 @@ class UserService:
                 if light.task:
                     light.task.has_changed = False
 
+    def mark_device_contact(self, device: Device):
+        """
+        Records that the device is connected, without marking its lights as seen like mark_device_visit does
+        """
+        with db_transaction():
+            device.last_contact = datetime.datetime.now()
+
     def add_setting(self, status: str, red: int, green: int, blue: int):
         with db_transaction():
             self.user.add_setting(LightSettings(status=status, color_red=red, color_blue=blue, color_green=green))
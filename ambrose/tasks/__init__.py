@@ -1,29 +1,138 @@
-from concurrent import futures
+from datetime import datetime
+from typing import List
 
 import celery
+from celery.exceptions import SoftTimeLimitExceeded
 from cryptography.fernet import Fernet
 from flask import current_app
 
-from ambrose.models import Account
-from ambrose.services import AccountService
+from ambrose.api.status import publish_device_statuses
+from ambrose.common import single_flight, metrics, mqtt, store
+from ambrose.models import Task, Account, DevOpsAccount
+from ambrose.services import AccountPoller, DevOpsAccountService, poll_offset, StatusService
 
 celery_app = celery.Celery()
 
+# how often the dispatcher looks for accounts with tasks that are due. This is the shortest possible polling interval
+POLL_INTERVAL = Task.FAST_POLL_INTERVAL
+
+# bounds how long a single batch can occupy a worker. Later cycles skip the accounts it is still polling
+POLL_SOFT_TIME_LIMIT = 45
+POLL_TIME_LIMIT = 55
+
+# how often DevOps catalogs are checked for being stale
+CATALOG_REFRESH_INTERVAL = 15 * 60
+
+# set while a user's statuses are scheduled to be published again, because one of them changes by itself
+MQTT_REPUBLISH_KEY = 'mqtt:republish:{}'
+
+
 @celery_app.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
-    sender.add_periodic_task(60, update_accounts.s(), name="update tasks")
+    sender.add_periodic_task(POLL_INTERVAL, update_accounts.s(), name="update tasks")
+    sender.add_periodic_task(CATALOG_REFRESH_INTERVAL, refresh_stale_devops_catalogs.s(),
+                             name="refresh devops catalogs")
 
 
-@celery_app.task
+@celery_app.task(ignore_result=True)
 def update_accounts():
-    print("Updating all accounts")
+    """
+    Dispatches the poll cycle: queues a poll_accounts task for each batch of accounts that have tasks due to be polled,
+    so the polling itself is spread across the worker processes. Each batch is delayed to its own slot within the
+    cycle (see poll_offset), so upstream requests and DB commits are spread out instead of all firing at the start of
+    the cycle. Batches that are not picked up before the next cycle expire rather than pile up.
+
+    Only one dispatcher runs at a time; a cycle that would overlap a dispatch in progress is skipped. Accounts that are
+    still being polled by an earlier cycle are skipped by the poller itself.
+    """
+    with single_flight('poll:cycle', POLL_INTERVAL) as acquired:
+        if not acquired:
+            metrics.incr('poll.cycle.skipped')
+            print('Skipping poll cycle, the previous cycle is still being dispatched')
+            return
+
+        batch_size = current_app.config.get('POLLING_BATCH_SIZE', 1)
+        jitter = current_app.config.get('POLLING_JITTER', 0)
+        account_ids = Task.due_account_ids(datetime.now())
+
+        for idx in range(0, len(account_ids), batch_size):
+            batch = account_ids[idx:idx + batch_size]
+            countdown = poll_offset(batch[0], POLL_INTERVAL, jitter)
+            poll_accounts.apply_async((batch,), countdown=countdown, expires=countdown + POLL_INTERVAL)
+
+
+@celery_app.task(ignore_result=True, acks_late=True, soft_time_limit=POLL_SOFT_TIME_LIMIT, time_limit=POLL_TIME_LIMIT)
+def poll_accounts(account_ids: List[int]):
+    """
+    Polls a batch of accounts. Polling only overwrites task statuses with the current upstream state, so a batch that
+    is redelivered (acks_late) or overlaps with another poll of the same accounts is harmless.
+    """
+    cipher = Fernet(current_app.secret_key)
+    poller = AccountPoller.from_config(current_app, cipher)
+
+    try:
+        print(poller.poll(account_ids))
+    except SoftTimeLimitExceeded:
+        print('Polling accounts {} exceeded the time limit'.format(account_ids))
+
+
+@celery_app.task(ignore_result=True)
+def refresh_devops_catalog(account_id: int):
+    """
+    Discovers a DevOps account's build and release definitions and caches them for the account tasks page, so the
+    organization is never crawled on a web request.
+    """
+    account = Account.by_id(account_id)
+    if not isinstance(account, DevOpsAccount):
+        return
+
+    cipher = Fernet(current_app.secret_key)
+    config = current_app.config
+    DevOpsAccountService(account, cipher).refresh_catalog(
+        max_workers=config.get('DEVOPS_DISCOVERY_MAX_WORKERS', 8),
+        timeout=config.get('DEVOPS_DISCOVERY_TIMEOUT', 120)
+    )
+    print('Refreshed the catalog of DevOps account {}'.format(account_id))
+
+
+@celery_app.task(ignore_result=True)
+def refresh_stale_devops_catalogs():
+    """
+    Queues a refresh of each DevOps catalog that is older than DEVOPS_CATALOG_TTL, so the account tasks page is usually
+    up to date when it is opened. Accounts whose tasks page was never opened don't have a catalog, and aren't crawled.
+    """
     cipher = Fernet(current_app.secret_key)
+    config = current_app.config
+    ttl = config.get('DEVOPS_CATALOG_TTL', 6 * 60 * 60)
+    # the mark expires in case the queued refresh is lost
+    mark_ttl = config.get('DEVOPS_DISCOVERY_TIMEOUT', 120) * 2
+
+    for account in DevOpsAccount.query.all():
+        service = DevOpsAccountService(account, cipher)
+        catalog = service.cached_catalog()
+        if catalog is not None and service.is_stale(catalog, ttl) and service.start_catalog_refresh(mark_ttl):
+            refresh_devops_catalog.delay(account.id)
+
+
+@celery_app.task(ignore_result=True)
+def publish_statuses(user_ids: List[int]):
+    """
+    Publishes the statuses of the users' devices to MQTT. A status that changes by itself (ie shows the time) is
+    published again when it does.
+    """
+    for user_id in user_ids:
+        max_age = publish_device_statuses(user_id)
+        if max_age is None:
+            continue
+
+        countdown = max(max_age, 1)
+        if store.add(MQTT_REPUBLISH_KEY.format(user_id), '1', ttl=countdown):
+            publish_statuses.apply_async(([user_id],), countdown=countdown)
+
+
+def queue_status_publication(user_ids):
+    if mqtt.enabled:
+        publish_statuses.delay(sorted(user_ids))
 
-    # jobs = []
-    # with futures.ThreadPoolExecutor() as executor:
-    for account in Account.all():
-        service = AccountService(account, cipher)
-        service.get_task_statuses()
-            # jobs.append(executor.submit(service.get_task_statuses))
 
-    # futures.wait(jobs)
\ No newline at end of file
+StatusService.change_listeners.append(queue_status_publication)
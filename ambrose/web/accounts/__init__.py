@@ -1,10 +1,11 @@
 from cryptography.fernet import Fernet
-from flask import Blueprint, render_template, redirect, url_for, abort
+from flask import Blueprint, render_template, redirect, url_for, abort, current_app
 
 from ambrose.common import cipher_required
 from ambrose.models import User, GitHubAccount, ApplicationInsightsAccount, DevOpsAccount, WebAccount
 from ambrose.services import DevOpsAccountService, UnauthorizedAccessException, AuthService, \
     ApplicationInsightsAccountService, GitHubAccountService, AccountService, WebAccountService
+from ambrose.tasks import refresh_devops_catalog
 from .forms import NewAccountForm, AccountForm, DevOpsTaskForm, ApplicationInsightsMetricForm, GitHubRepoStatusForm, \
     HealthcheckTaskForm
 
@@ -95,8 +96,43 @@ def devops_account_tasks(account: DevOpsAccount, cipher: Fernet):
 
         return redirect(url_for('.index'))
 
-    task_form = DevOpsTaskForm.build(*account_service.list_all_tasks())
-    return render_template('devops_account_tasks.html', account_id=account.id, form=task_form)
+    # the catalog is discovered by a background job - the page only ever renders what's cached, even if it is stale
+    catalog = account_service.cached_catalog()
+    progress = account_service.catalog_progress()
+    ttl = current_app.config.get('DEVOPS_CATALOG_TTL', 6 * 60 * 60)
+    if progress is None and (catalog is None or account_service.is_stale(catalog, ttl)):
+        start_catalog_refresh(account_service)
+        progress = account_service.catalog_progress()
+
+    if catalog is None:
+        return render_template('devops_account_tasks.html', account_id=account.id, form=None, progress=progress)
+
+    tasks = account_service.tasks_from_catalog(catalog)
+    task_form = DevOpsTaskForm.build(tasks.builds, tasks.releases)
+    return render_template('devops_account_tasks.html', account_id=account.id, form=task_form, progress=progress,
+                           incomplete_projects=tasks.incomplete, refreshed_at=catalog.get('refreshed_at'))
+
+
+@accounts_bp.route('/<int:account_id>/tasks/refresh')
+@AuthService.auth_required
+@cipher_required
+def refresh_account_tasks(account_id: int, user: User, cipher: Fernet):
+    account = None
+    try:
+        account = AccountService.get_account(account_id, user)
+    except UnauthorizedAccessException:
+        abort(403)
+
+    if isinstance(account, DevOpsAccount):
+        start_catalog_refresh(DevOpsAccountService(account, cipher))
+
+    return redirect(url_for('.account_tasks', account_id=account_id))
+
+
+def start_catalog_refresh(account_service: DevOpsAccountService):
+    timeout = current_app.config.get('DEVOPS_DISCOVERY_TIMEOUT', 120)
+    if account_service.start_catalog_refresh(ttl=timeout * 2):
+        refresh_devops_catalog.delay(account_service.account.id)
 
 
 def app_insights_account_tasks(account: ApplicationInsightsAccount):
@@ -107,7 +143,8 @@ def app_insights_account_tasks(account: ApplicationInsightsAccount):
             new_metric_form.metric.data,
             new_metric_form.nickname.data,
             new_metric_form.aggregation.data,
-            new_metric_form.timespan.data
+            new_metric_form.timespan.data,
+            new_metric_form.always_poll.data
         )
 
         return redirect(url_for('.index'))
@@ -119,7 +156,7 @@ def github_account_tasks(account: GitHubAccount, cipher: Fernet):
     form = GitHubRepoStatusForm()
 
     if form.validate_on_submit():
-        GitHubAccountService(account, cipher).add_repo_task(form.repo.data, form.nickname.data)
+        GitHubAccountService(account, cipher).add_repo_task(form.repo.data, form.nickname.data, form.always_poll.data)
 
         return redirect(url_for('.index'))
 
@@ -129,7 +166,7 @@ def web_account_tasks(account: WebAccount):
     form = HealthcheckTaskForm()
 
     if form.validate_on_submit():
-        WebAccountService(account).add_healthcheck(form.path.data)
+        WebAccountService(account).add_healthcheck(form.path.data, form.always_poll.data)
 
         return redirect(url_for('.index'))
 
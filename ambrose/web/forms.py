@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectField, IntegerField
+from wtforms import StringField, PasswordField, SelectField, IntegerField, BooleanField
 from wtforms.validators import InputRequired, EqualTo
 
 
@@ -28,6 +28,7 @@ class TaskForm(FlaskForm):
     """
     _model_registry = {}
     nickname = StringField('Nickname')
+    always_poll = BooleanField('Always poll (even when not displayed)')
 
     def __init_subclass__(cls, **kwargs):
         cls._model_registry[cls._model.__name__] = cls
@@ -17,10 +17,20 @@ def index(user: User):
         account_id = new_task_form.account.data
         return redirect(url_for('accounts.account_tasks', account_id=account_id))
 
+    # the user is looking at the current values, so make sure they get refreshed soon
+    UserService(user).touch_tasks(user.tasks)
+
     token = AuthService.jwt(user)
     return render_template('tasks.html', tasks=user.tasks, form=new_task_form, jwt=token)
 
 
+@tasks_bp.route('/<int:task_id>/refresh')
+@AuthService.auth_required
+def refresh(task_id: int, user_service: UserService):
+    user_service.touch_tasks([user_service.get_task(task_id)])
+    return redirect(url_for('.index'))
+
+
 @tasks_bp.route('/<int:task_id>', methods=['GET', 'POST'])
 @AuthService.auth_required
 def task(task_id: int, user_service: UserService):
@@ -1,13 +1,24 @@
+from collections import namedtuple
 from numbers import Number
-from typing import Optional
+from typing import Optional, Iterable, Dict, Any
 
 import requests
 from dateutil import parser
 
-from json_object import JSONObject
+from http_client import HTTPClient
+from json_object import JSONObject, Projection
+
+
+# a single metric query in a batch. id is chosen by the caller, and is used to match the result to the query
+MetricQuery = namedtuple('MetricQuery', 'id metric aggregation timespan')
 
 
 class MetricJSON(JSONObject):
+    __slots__ = ()
+
+    # the metric itself is keyed by its name, so the whole value is kept
+    PROJECTION = Projection('value')
+
     def __init__(self, json: dict):
         super(MetricJSON, self).__init__(json['value'])
 
@@ -30,6 +41,15 @@ class Metric:
 class ApplicationInsightsService:
     BASE_URL_TEMPLATE = 'https://api.applicationinsights.io/v1/apps/{}/'
 
+    # shared by all instances. The timeouts are strict, so one hung metric query cannot hold up a whole poll. Batch
+    # queries are POSTs, but only read metrics, so they are retried like GETs
+    client = HTTPClient('application_insights', timeout=(3.05, 5), retries=2, retry_methods=('POST',))
+
+    # maximum number of metric queries sent in one batch request
+    BATCH_SIZE = 20
+    # fields kept from each result of a batch
+    BATCH_PROJECTION = Projection('id', 'status', 'body.value')
+
     def __init__(self, application_id: str, api_key: str):
         self.application_id = application_id
         self.api_key = api_key
@@ -62,13 +82,54 @@ class ApplicationInsightsService:
             return Metric(json, metric)
         return None
 
+    def get_metrics(self, queries: Iterable[MetricQuery]) -> Dict[str, Metric]:
+        """
+        Retrieves several metrics using the batch metrics endpoint, BATCH_SIZE queries per request.
+        :param queries: the metric queries. As with get_metric, aggregation and timespan may be None
+        :return: the retrieved metrics, keyed by query id. Queries that failed are left out
+        """
+        queries = list(queries)
+        metrics = {}
+
+        for idx in range(0, len(queries), self.BATCH_SIZE):
+            batch = {q.id: q for q in queries[idx:idx + self.BATCH_SIZE]}
+            results = self._post('metrics', [self._batch_item(q) for q in batch.values()])
+            if results is None:
+                continue
+
+            for result in results:
+                query = batch.get(result.get('id'))
+                if query is None or not 200 <= result.get('status', 0) < 400:
+                    continue
+                metrics[query.id] = Metric(MetricJSON(result['body']), query.metric)
+
+        return metrics
+
+    @staticmethod
+    def _batch_item(query: MetricQuery) -> Dict[str, Any]:
+        parameters = {'metricId': query.metric}
+        if query.aggregation:
+            parameters['aggregation'] = query.aggregation
+        if query.timespan:
+            parameters['timespan'] = query.timespan
+
+        return {'id': query.id, 'parameters': parameters}
+
+    def _post(self, endpoint: str, body: Any) -> Optional[Any]:
+        url = self.BASE_URL_TEMPLATE.format(self.application_id) + endpoint
+        res = self.client.post(url, json=body, headers={'x-api-key': self.api_key})
+        if 200 <= res.status_code < 400:
+            return self.BATCH_PROJECTION.from_response(res)
+
+        return None
+
     def _get(self, url: str) -> requests.Response:
-        return requests.get(url, headers={'x-api-key': self.api_key})
+        return self.client.get(url, headers={'x-api-key': self.api_key})
 
     def _request(self, endpoint: str) -> Optional[MetricJSON]:
         url = self.BASE_URL_TEMPLATE.format(self.application_id) + endpoint
         res = self._get(url)
         if 200 <= res.status_code < 400:
-            return MetricJSON(res.json())
+            return MetricJSON(MetricJSON.PROJECTION.from_response(res))
 
         return None
@@ -0,0 +1,53 @@
+"""
+Compares the installed JSON backends (see json_object.backend) on the two hot paths: encoding a device's
+/api/status response, and decoding a DevOps release listing.
+
+Run from the repository root:
+
+    python -m benchmarks.json_backend_benchmark
+"""
+import timeit
+
+from json_object import json_backend
+from benchmarks.projection_benchmark import release_listing
+
+# releases in the decoded listing, about 1.1 MiB of JSON
+RELEASES = 50
+
+
+def status_response(lights=16, messages=8, gauges=4):
+    return {
+        'lights': [{
+            'type': 'BLINK',
+            'primary_color': {'red': 255, 'green': 0, 'blue': 0},
+            'primary_period': 1000,
+            'secondary_color': {'red': 0, 'green': 0, 'blue': 255},
+            'secondary_period': 500,
+            'repeat': None,
+        } for _ in range(lights)],
+        'messages': ['Release-{} deployed to production'.format(idx) for idx in range(messages)],
+        'gauges': [{'position': idx / gauges} for idx in range(gauges)],
+    }
+
+
+def main():
+    status = status_response()
+    listing = release_listing(RELEASES)
+
+    backends = [json_backend.select(name) for name in ('json', 'ujson', 'orjson') if json_backend.available(name)]
+    print('Backends: {}'.format(', '.join(backend.name for backend in backends)))
+
+    baseline = {}
+    for label, number, run in [
+        ('encode /api/status', 10000, lambda backend: backend.dumps(status)),
+        ('decode release listing', 20, lambda backend: backend.loads(listing)),
+    ]:
+        print(label)
+        for backend in backends:
+            seconds = timeit.timeit(lambda: run(backend), number=number) / number
+            baseline.setdefault(label, seconds)
+            print('  {:<8} {:10.1f} us {:6.1f}x'.format(backend.name, seconds * 1e6, baseline[label] / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Compares JSONObject against the previous implementation, which copied and re-keyed every dict on construction and
+built a new wrapper on every attribute access.
+
+The workload walks a release summary the way ReleaseSummary used to: for each environment of the definition, look up
+its last release and scan that release's environments for the matching one. It is run once per wrapped payload, as
+when a summary is only read once, and repeatedly on the same payload, as when every task of an account reads it.
+
+Run from the repository root:
+
+    python -m benchmarks.json_object_benchmark
+"""
+import keyword
+import timeit
+import tracemalloc
+from collections import abc
+
+from json_object import JSONObject
+
+ENVIRONMENTS = 20
+RELEASES = 50
+
+
+class LegacyJSONObject:
+    def __new__(cls, arg):
+        if isinstance(arg, abc.Mapping):
+            return super().__new__(cls)
+        elif isinstance(arg, abc.MutableSequence):
+            return [cls(item) for item in arg]
+        else:
+            return arg
+
+    def __init__(self, wrapped):
+        self._data = {}
+
+        for key, value in wrapped.items():
+            if isinstance(key, str):
+                key = key.replace('/', '_')
+                if keyword.iskeyword(key):
+                    key += '_'
+            self._data[key] = value
+
+    def __getattr__(self, item):
+        if item in self.__dict__:
+            return self.__dict__[item]
+        if hasattr(self._data, item):
+            return getattr(self._data, item)
+        return LegacyJSONObject(self._data[item])
+
+    def __getitem__(self, item):
+        return self._data[item]
+
+    def __contains__(self, item):
+        return item in self._data
+
+
+def release_summary():
+    return {
+        'releaseDefinition': {'id': 1, 'name': 'pipeline', '_links': {'self': {'href': 'https://example.com'}}},
+        'environments': [{'id': env, 'name': 'env {}'.format(env), 'lastReleases': [{'id': RELEASES - 1}]}
+                         for env in range(ENVIRONMENTS)],
+        'releases': [{
+            'id': release,
+            'name': 'Release-{}'.format(release),
+            'environments': [{
+                'id': release * 100 + env,
+                'definitionEnvironmentId': env,
+                'name': 'env {}'.format(env),
+                'status': 'succeeded',
+                'postDeployApprovals': [{'status': 'approved'}],
+            } for env in range(ENVIRONMENTS)]
+        } for release in range(RELEASES)]
+    }
+
+
+def walk(summary):
+    releases = {rel.id: rel for rel in summary.releases}
+    statuses = []
+    for env in summary.environments:
+        release = releases[env.lastReleases[0].id]
+        for release_env in release.environments:
+            if release_env.definitionEnvironmentId == env.id:
+                statuses.append((summary.releaseDefinition.name, release_env.name, release_env.status))
+                break
+    return statuses
+
+
+def run(cls, payload, walks):
+    summary = cls(payload)
+    for _ in range(walks):
+        walk(summary)
+
+
+def measure(cls, payload, walks, number=20):
+    seconds = timeit.timeit(lambda: run(cls, payload, walks), number=number) / number
+
+    tracemalloc.start()
+    run(cls, payload, walks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds, peak
+
+
+def main():
+    payload = release_summary()
+    assert walk(JSONObject(payload)) == walk(LegacyJSONObject(payload))
+
+    for walks in (1, ENVIRONMENTS):
+        print('{} walk(s) per payload'.format(walks))
+        results = {cls.__name__: measure(cls, payload, walks) for cls in (LegacyJSONObject, JSONObject)}
+        for name, (seconds, peak) in results.items():
+            print('  {:<18} {:8.3f} ms {:10.1f} KiB peak'.format(name, seconds * 1000, peak / 1024))
+
+        legacy, current = results['LegacyJSONObject'], results['JSONObject']
+        print('  {:.1f}x faster, {:.1f}x the peak memory'.format(legacy[0] / current[0], current[1] / legacy[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Compares decoding a DevOps release listing in full against decoding it through ReleaseList's projection, both from
+the fully decoded body and with the streaming parser (if ijson is installed).
+
+The payload imitates a real listing: each release carries links, artifacts, variables and deploy steps that polling
+never reads. Bodies are read from a file-like object, as from a response, so reading the whole body into memory counts
+against the approaches that need it. For listings of several sizes, the benchmark reports the time to decode the body
+and answer a status lookup for every environment, the peak memory while doing so, and the memory still held by the
+decoded ReleaseList afterwards. It is what Projection.STREAM_THRESHOLD is chosen from: streaming is slower, so it only
+pays off once a body is large enough for the memory it saves to matter.
+
+Run from the repository root:
+
+    python -m benchmarks.projection_benchmark
+"""
+import io
+import json
+import timeit
+import tracemalloc
+from typing import BinaryIO
+
+from devops.devops_json import ReleaseList
+from json_object import projection
+
+SIZES = (5, 10, 25, 50, 100)
+ENVIRONMENTS = 10
+
+
+def identity(release, env):
+    return {'id': 'user-{}-{}'.format(release, env), 'displayName': 'Some User', 'uniqueName': 'user@example.com',
+            'url': 'https://example.com/_apis/Identities/user-{}'.format(release), 'imageUrl': 'https://example.com'}
+
+
+def release_listing(releases: int) -> bytes:
+    return json.dumps({'count': releases, 'value': [{
+        'id': release,
+        'name': 'Release-{}'.format(release),
+        'status': 'active',
+        'createdBy': identity(release, 0),
+        'modifiedBy': identity(release, 0),
+        'releaseDefinition': {'id': release % 5, 'name': 'pipeline-{}'.format(release % 5),
+                              '_links': {'web': {'href': 'https://example.com/definitions/{}'.format(release % 5)}}},
+        'artifacts': [{'type': 'Build', 'alias': 'build', 'definitionReference': {
+            key: {'id': str(release), 'name': 'value-{}'.format(key)} for key in
+            ('artifactSourceDefinitionUrl', 'branch', 'buildUri', 'definition', 'project', 'repository', 'version')
+        }}],
+        'variables': {'variable-{}'.format(v): {'value': 'x' * 40} for v in range(10)},
+        '_links': {'self': {'href': 'https://example.com/releases/{}'.format(release)}},
+        'environments': [{
+            'id': release * 100 + env,
+            'definitionEnvironmentId': (release % 5) * 100 + env,
+            'name': 'environment {}'.format(env),
+            'status': 'succeeded',
+            'variables': {'variable-{}'.format(v): {'value': 'y' * 40} for v in range(5)},
+            'preDeployApprovals': [{'id': env, 'status': 'approved', 'approver': identity(release, env)}],
+            'postDeployApprovals': [{'id': env, 'status': 'approved', 'approver': identity(release, env)}],
+            'deploySteps': [{'id': step, 'attempt': step, 'requestedBy': identity(release, env),
+                             'releaseDeployPhases': [{'status': 'succeeded', 'logs': 'z' * 200}]}
+                            for step in range(2)],
+            'owner': identity(release, env),
+        } for env in range(ENVIRONMENTS)]
+    } for release in range(releases)]}).encode('utf-8')
+
+
+def full(fp: BinaryIO) -> ReleaseList:
+    return ReleaseList(json.loads(fp.read()))
+
+
+def projected(fp: BinaryIO) -> ReleaseList:
+    return ReleaseList(ReleaseList.PROJECTION.apply(json.loads(fp.read())))
+
+
+def streamed(fp: BinaryIO) -> ReleaseList:
+    return ReleaseList(ReleaseList.PROJECTION.load(fp))
+
+
+def poll(decode, body: bytes):
+    releases = decode(io.BytesIO(body))
+    statuses = [releases.status_for_environment(definition * 100 + env, definition)
+                for definition in range(5) for env in range(ENVIRONMENTS)]
+    return releases, statuses
+
+
+def measure(decode, body: bytes, number=20):
+    seconds = timeit.timeit(lambda: poll(decode, body), number=number) / number
+
+    tracemalloc.start()
+    releases, _ = poll(decode, body)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del releases
+
+    return seconds, peak, retained
+
+
+def main():
+    approaches = [full, projected]
+    if projection.ijson is not None:
+        approaches.append(streamed)
+    else:
+        print('ijson is not installed, skipping the streaming parser')
+
+    for releases in SIZES:
+        body = release_listing(releases)
+        expected = poll(full, body)[1]
+        assert all(poll(decode, body)[1] == expected for decode in approaches)
+
+        print('{} releases x {} environments, {:.1f} KiB body'.format(releases, ENVIRONMENTS, len(body) / 1024))
+        for decode in approaches:
+            seconds, peak, retained = measure(decode, body)
+            print('  {:<10} {:8.2f} ms {:10.1f} KiB peak {:10.1f} KiB retained'.format(
+                decode.__name__, seconds * 1000, peak / 1024, retained / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,2 @@
-from .service import DevOpsService
+from .service import DevOpsService, DevOpsRequestException
 from .devops_json import DevOpsReleaseWebHook
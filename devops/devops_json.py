@@ -1,9 +1,11 @@
 from collections import namedtuple
-from typing import Optional, List, Any, Dict, Iterable, Mapping
+from typing import Optional, List, Any, Dict, Iterable, Mapping, Tuple
 
-from json_object import JSONObject
+from json_object import JSONObject, Projection
 
 ReleaseStatus = namedtuple('ReleaseStatus', 'name status current')
+# one page of a listing - the raw items, and the token for the next page (None on the last page)
+DevOpsPage = namedtuple('DevOpsPage', 'items continuation_token')
 BuildStatus = namedtuple('BuildStatus', 'name status')
 
 
@@ -19,38 +21,46 @@ def format_status(status: str) -> str:
 
 
 class DevOpsJSON(JSONObject):
-    pass
+    __slots__ = ()
 
+    # the fields the class reads. Responses are decoded into just these, see json_object.Projection
+    PROJECTION = None
 
-class ReleaseSummary(DevOpsJSON):
-    def __init__(self, json: Mapping[str, Any]):
-        super(ReleaseSummary, self).__init__(json)
-        if 'releases' in json:
-            self._data['releases'] = {rel.id: rel for rel in self.releases}
 
-    def status(self) -> Dict[str, ReleaseStatus]:
-        pipeline_name = self.releaseDefinition.name
+# fields kept from each page of the definition listings
+BUILD_DEFINITIONS_PROJECTION = Projection('value.id', 'value.name')
+RELEASE_DEFINITIONS_PROJECTION = Projection('value.id', 'value.name', 'value.environments.id',
+                                            'value.environments.name')
 
-        statuses = {}
-        for env in self.environments:
-            last_release = env.lastReleases
-            if not last_release or len(last_release) < 1:
-                continue
 
-            last_release_id = last_release[0].id
+class ReleaseDeployments(DevOpsJSON):
+    """
+    Base for documents that tell which release is currently deployed to each environment of one or more release
+    definitions. Subclasses find the deployments; they are indexed once, by definition environment id, so every lookup
+    is a dictionary access.
+    """
 
-            release = self.releases[last_release_id]
+    def __init__(self, json: Mapping[str, Any]):
+        super(ReleaseDeployments, self).__init__(json)
 
-            release_env = [rel_env for rel_env in release.environments if rel_env.definitionEnvironmentId == env.id]
-            if len(release_env) < 1:
-                continue
+        # definition environment id -> (release, release environment)
+        self._deployments: Dict[int, Tuple[JSONObject, JSONObject]] = self._find_deployments()
+
+    def _find_deployments(self) -> Dict[int, Tuple[JSONObject, JSONObject]]:
+        raise NotImplementedError
 
-            release_env = release_env[0]
+    def _pipeline_name(self, release: JSONObject) -> str:
+        raise NotImplementedError
 
-            env_name = '{}_{}'.format(pipeline_name, release_env.name).replace(' ', '_')
-            env_status = self._format_status(release_env)
+    def _environment_name(self, release: JSONObject, release_env: JSONObject) -> str:
+        return '{}_{}'.format(self._pipeline_name(release), release_env.name).replace(' ', '_')
 
-            statuses[env_name] = ReleaseStatus(name=env_name, status=env_status, current=release.name)
+    def status(self) -> Dict[str, ReleaseStatus]:
+        statuses = {}
+        for release, release_env in self._deployments.values():
+            env_name = self._environment_name(release, release_env)
+            statuses[env_name] = ReleaseStatus(name=env_name, status=self._format_status(release_env),
+                                               current=release.name)
 
         return statuses
 
@@ -67,104 +77,147 @@ class ReleaseSummary(DevOpsJSON):
 
         return status
 
-    def status_for_environment(self, env_id: int) -> Optional[str]:
-        environment = None
-        for env in self.environments:
-            if env.id == env_id:
-                environment = env
-                break
-
-        if environment is None:
-            return None
-
-        last_release = environment.lastReleases
-        if not last_release or len(last_release) < 1:
+    def status_for_environment(self, env_id: int, definition_id: Optional[int] = None) -> Optional[str]:
+        deployment = self._deployments.get(env_id)
+        if deployment is None:
             return None
 
-        release = self.releases[last_release[0].id]
-
-        release_env = None
-        for env in release.environments:
-            if env.definitionEnvironmentId == env_id:
-                release_env = env
-                break
-        if release_env is None:
-            return None
-
-        return self._format_status(release_env)
+        return self._format_status(deployment[1])
 
     def environment_names(self) -> List[str]:
-        environments = []
+        return [self._environment_name(release, release_env) for release, release_env in self._deployments.values()]
+
+
+class ReleaseSummary(ReleaseDeployments):
+    """
+    The environments of a release definition, and the releases last deployed to them.
+    """
+    PROJECTION = Projection(
+        'releaseDefinition.name',
+        'environments.id',
+        'environments.lastReleases.id',
+        'releases.id',
+        'releases.name',
+        'releases.environments.definitionEnvironmentId',
+        'releases.environments.name',
+        'releases.environments.status',
+        'releases.environments.postDeployApprovals.status',
+    )
+
+    def _find_deployments(self) -> Dict[int, Tuple[JSONObject, JSONObject]]:
+        # in the order of the definition's environments
+        deployments = {}
+        if 'releases' not in self or 'environments' not in self:
+            return deployments
+
+        releases = {rel.id: rel for rel in self.releases}
         for env in self.environments:
             last_release = env.lastReleases
             if not last_release or len(last_release) < 1:
                 continue
 
-            last_release_id = last_release[0].id
+            release = releases.get(last_release[0].id)
+            if release is None:
+                continue
 
-            release = self.releases[last_release_id]
+            release_env = {rel_env.definitionEnvironmentId: rel_env for rel_env in release.environments}.get(env.id)
+            if release_env is not None:
+                deployments[env.id] = (release, release_env)
 
-            release_env = [rel_env for rel_env in release.environments if rel_env.definitionEnvironmentId == env.id]
-            if len(release_env) < 1:
-                continue
+        return deployments
 
-            release_env = release_env[0]
+    def _pipeline_name(self, release: JSONObject) -> str:
+        return self.releaseDefinition.name
 
-            environments.append('{}_{}'.format(self.releaseDefinition.name, release_env.name).replace(' ', '_'))
 
-        return environments
+class ReleaseList(ReleaseDeployments):
+    """
+    The most recent releases of a project, across all of its definitions, newest first. The status of an environment
+    is its status in the newest release that was deployed to it, so one listing answers status_for_environment for
+    every definition it covers.
+    """
+    PROJECTION = Projection(
+        'value.name',
+        'value.releaseDefinition.id',
+        'value.releaseDefinition.name',
+        'value.environments.definitionEnvironmentId',
+        'value.environments.name',
+        'value.environments.status',
+        'value.environments.postDeployApprovals.status',
+    )
 
+    def __init__(self, json: Mapping[str, Any]):
+        super(ReleaseList, self).__init__({'releases': json['value']})
 
-class BuildSummary(DevOpsJSON):
-    def status(self) -> Dict[str, BuildStatus]:
-        statuses = {}
-        for val in self.value:
-            name = val.definition.name
-            status = val.status
-            if status == 'completed':
-                status = val.result
-            statuses[name] = BuildStatus(name=name, status=format_status(status))
+    def _find_deployments(self) -> Dict[int, Tuple[JSONObject, JSONObject]]:
+        deployments = {}
+        for release in self.releases:
+            for env in release.environments:
+                # environments a release never got to are skipped, so they show the release before it
+                if env.definitionEnvironmentId not in deployments and env.status.lower() != 'notstarted':
+                    deployments[env.definitionEnvironmentId] = (release, env)
 
-        return statuses
+        return deployments
 
-    def status_for_definition(self, definition_id: int) -> Optional[str]:
-        target_build = None
-        for build in self.value:
-            if build.definition.id == definition_id:
-                target_build = build
-                break
-        if target_build is None:
+    def _pipeline_name(self, release: JSONObject) -> str:
+        return release.releaseDefinition.name
+
+    def covers(self, definition_id: int, env_id: int) -> bool:
+        deployment = self._deployments.get(env_id)
+        return deployment is not None and deployment[0].releaseDefinition.id == definition_id
+
+    def status_for_environment(self, env_id: int, definition_id: Optional[int] = None) -> Optional[str]:
+        if definition_id is not None and not self.covers(definition_id, env_id):
             return None
 
-        status = target_build.status
-        if status == 'completed':
-            status = target_build.result
+        return super(ReleaseList, self).status_for_environment(env_id)
 
-        return format_status(status)
 
+class BuildSummary(DevOpsJSON):
+    """
+    The latest build of each of a set of build definitions, indexed by definition id.
+    """
+    PROJECTION = Projection('value.definition.id', 'value.definition.name', 'value.status', 'value.result')
 
-class DevOpsProjects(DevOpsJSON):
     def __init__(self, json: Mapping[str, Any]):
-        super(DevOpsProjects, self).__init__({"projects": json['value']})
+        super(BuildSummary, self).__init__(json)
 
-    def __iter__(self) -> Iterable[JSONObject]:
-        return iter(self.projects)
+        self._builds: Dict[int, JSONObject] = {}
+        for build in self.value if 'value' in json else []:
+            self._builds.setdefault(build.definition.id, build)
 
+    @staticmethod
+    def _build_status(build: JSONObject) -> str:
+        status = build.status
+        if status == 'completed':
+            status = build.result
 
-class DevOpsReleaseDefinitions(DevOpsJSON):
-    def __init__(self, json: Mapping[str, Any]):
-        super(DevOpsReleaseDefinitions, self).__init__({'definitions': json['value']})
+        return format_status(status)
 
-    def __iter__(self) -> Iterable[JSONObject]:
-        return iter(self.definitions)
+    def status(self) -> Dict[str, BuildStatus]:
+        statuses = {}
+        for build in self._builds.values():
+            name = build.definition.name
+            statuses[name] = BuildStatus(name=name, status=self._build_status(build))
 
+        return statuses
+
+    def status_for_definition(self, definition_id: int) -> Optional[str]:
+        build = self._builds.get(definition_id)
+        if build is None:
+            return None
+
+        return self._build_status(build)
+
+
+class DevOpsProjects(DevOpsJSON):
+    PROJECTION = Projection('value.name')
 
-class DevOpsBuildDefinitions(DevOpsJSON):
     def __init__(self, json: Mapping[str, Any]):
-        super(DevOpsBuildDefinitions, self).__init__({'builds': json['value']})
+        super(DevOpsProjects, self).__init__({"projects": json['value']})
 
     def __iter__(self) -> Iterable[JSONObject]:
-        return iter(self.builds)
+        return iter(self.projects)
 
 
 class DevOpsReleaseWebHook(DevOpsJSON):
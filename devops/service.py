@@ -1,32 +1,65 @@
-from typing import Optional, Iterable, Type, TypeVar
+from typing import Any, Optional, Iterable, Iterator, Type, TypeVar
+from urllib.parse import quote
 
 import requests
 from requests.auth import HTTPBasicAuth
 
-from devops.devops_json import DevOpsJSON, ReleaseSummary, BuildSummary, DevOpsReleaseDefinitions, \
-    DevOpsBuildDefinitions, DevOpsProjects
+from devops.devops_json import DevOpsJSON, DevOpsPage, ReleaseSummary, ReleaseList, BuildSummary, DevOpsProjects, \
+    BUILD_DEFINITIONS_PROJECTION, RELEASE_DEFINITIONS_PROJECTION
+from json_object import Projection, json_backend
+from http_client import HTTPClient
+
+
+class DevOpsRequestException(Exception):
+    pass
 
 
 class DevOpsService:
     BASE_URL_TEMPLATE = 'https://{}dev.azure.com/{}/{}/_apis/'
     RELEASE_PREFIX = 'vsrm'
+    # how far back list_releases looks. Definitions with no deployed release in this window need get_release_summary
+    RELEASES_PER_PROJECT = 50
+    # items per page of the paged listings
+    PAGE_SIZE = 100
+
+    # shared by all instances, so connections to dev.azure.com and vsrm.dev.azure.com are reused across accounts
+    client = HTTPClient('devops')
 
     def __init__(self, username, token, organization):
         self.auth = HTTPBasicAuth(username, token)
         self.organization = organization
-
-    def list_release_definitions(self, project: str) -> Optional[DevOpsReleaseDefinitions]:
+        # cached responses are only reused for the same credentials
+        self.credential = '{}:{}'.format(username, token)
+
+    def list_release_definitions(self, project: str) -> Iterator[DevOpsJSON]:
+        """
+        Yields every release definition of the project, fetching a page at a time.
+        :raises DevOpsRequestException: if a page can't be fetched
+        """
         endpoint = 'release/definitions?api-version=5.0-preview.3&$expand=Environments'
-        return self._request(project, endpoint, self.RELEASE_PREFIX, return_type=DevOpsReleaseDefinitions)
+        return self._paged(project, endpoint, RELEASE_DEFINITIONS_PROJECTION, self.RELEASE_PREFIX)
 
-    def list_build_definitions(self, project: str) -> Optional[DevOpsBuildDefinitions]:
+    def list_build_definitions(self, project: str) -> Iterator[DevOpsJSON]:
+        """
+        Yields every build definition of the project, fetching a page at a time.
+        :raises DevOpsRequestException: if a page can't be fetched
+        """
         endpoint = 'build/definitions?api-version=5.0'
-        return self._request(project, endpoint, return_type=DevOpsBuildDefinitions)
+        return self._paged(project, endpoint, BUILD_DEFINITIONS_PROJECTION)
 
     def get_release_summary(self, project: str, definition_id: int) -> Optional[ReleaseSummary]:
         endpoint = 'release/releases?definitionId={}&releaseCount=1&api-version=5.0-preview.8'.format(definition_id)
         return self._request(project, endpoint, self.RELEASE_PREFIX, return_type=ReleaseSummary)
 
+    def list_releases(self, project: str) -> Optional[ReleaseList]:
+        """
+        Lists the project's most recent releases, across all definitions. The url doesn't depend on which definitions
+        the caller watches, so the response is shared by every account polling the project.
+        """
+        endpoint = 'release/releases?$expand=environments,approvals&queryOrder=descending&$top={}' \
+                   '&api-version=5.0'.format(self.RELEASES_PER_PROJECT)
+        return self._request(project, endpoint, self.RELEASE_PREFIX, return_type=ReleaseList)
+
     def get_release(self, project: str, release_id: int) -> Optional[DevOpsJSON]:
         endpoint = 'release/releases/{}?api-version=5.0-preview.8'.format(release_id)
         return self._request(project, endpoint, self.RELEASE_PREFIX)
@@ -46,22 +79,59 @@ class DevOpsService:
     def list_projects(self) -> Optional[DevOpsProjects]:
         endpoint = 'projects?api-version=5.0'
         url = 'https://dev.azure.com/{}/_apis/{}'.format(self.organization, endpoint)
-        res = self._get(url)
-        if 200 <= res.status_code < 400:
-            return DevOpsProjects(res.json())
-        return None
-
-    def _get(self, url: str) -> requests.Response:
-        return requests.get(url, auth=self.auth)
+        return self._get(url, DevOpsProjects)
 
     T = TypeVar('T', bound=DevOpsJSON)
 
+    def _get(self, url: str, return_type: Type[T]) -> Optional[T]:
+        def decode(res: requests.Response) -> Optional[Any]:
+            if 200 <= res.status_code < 400:
+                projection = return_type.PROJECTION
+                return projection.from_response(res) if projection else json_backend.loads(res.content)
+            return None
+
+        # conditional request - an unchanged response comes back as a 304, and the cached document is reused as is.
+        # The body is streamed, so large responses can be decoded without holding all of it. The document is shared
+        # with the other processes polling with the same credential, but never across credentials, which may not see
+        # the same data
+        value = self.client.get_shared(url, decode, credential=self.credential, auth=self.auth, stream=True)
+        return return_type(value) if value is not None else None
+
     def _request(self, project: str, endpoint: str, host_prefix: str = '', return_type: Type[T] = DevOpsJSON) -> T:
+        return self._get(self._url(project, endpoint, host_prefix), return_type)
+
+    def _paged(self, project: str, endpoint: str, projection: Projection, host_prefix: str = '') -> Iterator[DevOpsJSON]:
+        """
+        Follows the x-ms-continuationtoken header through a listing, yielding its items as each page arrives. Pages are
+        fetched with plain requests rather than get_cached, so no page is kept after its items have been yielded.
+        """
+        url = self._url(project, endpoint, host_prefix) + '&$top={}'.format(self.PAGE_SIZE)
+        token = None
+        while True:
+            page_url = url if token is None else '{}&continuationToken={}'.format(url, quote(token, safe=''))
+            page = self._get_page(page_url, projection)
+            if page is None:
+                raise DevOpsRequestException('Failed to get {}'.format(page_url))
+
+            token = page.continuation_token
+            for item in page.items:
+                yield DevOpsJSON(item)
+            # let go of the page before fetching the next one
+            del page
+
+            if not token:
+                return
+
+    def _get_page(self, url: str, projection: Projection) -> Optional[DevOpsPage]:
+        res = self.client.get(url, auth=self.auth, stream=True)
+        try:
+            if not 200 <= res.status_code < 400:
+                return None
+            return DevOpsPage(projection.from_response(res)['value'], res.headers.get('x-ms-continuationtoken'))
+        finally:
+            res.close()
+
+    def _url(self, project: str, endpoint: str, host_prefix: str = '') -> str:
         if len(host_prefix) > 0 and not host_prefix.endswith('.'):
             host_prefix += '.'
-        url = self.BASE_URL_TEMPLATE.format(host_prefix, self.organization, project) + endpoint
-        res = self._get(url)
-        if 200 <= res.status_code < 400:
-            return return_type(res.json())
-
-        return None
+        return self.BASE_URL_TEMPLATE.format(host_prefix, self.organization, project) + endpoint
@@ -0,0 +1,102 @@
+from collections import namedtuple
+from typing import Iterable, Tuple, Dict, List, Optional, Any, Mapping
+
+from http_client import HTTPClient
+from json_object import json_backend
+
+# mergeable is True, False or None while GitHub is still computing it (the same as the REST API's mergeable)
+PullRequestStatus = namedtuple('PullRequestStatus', 'mergeable review_count changes_requested')
+RepositoryStatus = namedtuple('RepositoryStatus', 'owner name pr_count pull_requests')
+
+_MERGEABLE = {
+    'MERGEABLE': True,
+    'CONFLICTING': False,
+}
+
+
+class GitHubGraphQLService:
+    """
+    Retrieves the open pull request status of many repositories with a few GraphQL queries, instead of several REST
+    calls per pull request. Each query covers up to REPOS_PER_QUERY repositories, and looks at the first
+    PULL_REQUESTS_PER_REPO open pull requests of each (pr_count is always the full count).
+    """
+    URL = 'https://api.github.com/graphql'
+
+    client = HTTPClient('github')
+
+    REPOS_PER_QUERY = 20
+    PULL_REQUESTS_PER_REPO = 100
+
+    _REPOSITORY_FRAGMENT = '''
+    repo{idx}: repository(owner: $owner{idx}, name: $name{idx}) {{
+        pullRequests(states: OPEN, first: {prs}) {{
+            totalCount
+            nodes {{
+                mergeable
+                reviews {{ totalCount }}
+                changesRequested: reviews(states: CHANGES_REQUESTED) {{ totalCount }}
+            }}
+        }}
+    }}'''
+
+    def __init__(self, token: str):
+        self.token = token
+
+    def get_repository_statuses(self, repos: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], RepositoryStatus]:
+        """
+        :param repos: (owner, name) pairs
+        :return: the status of each repository, keyed by its (owner, name) pair. Repositories that could not be
+        retrieved (ie, they do not exist or the token can not see them) are left out
+        """
+        repos = list(dict.fromkeys(repos))
+        statuses = {}
+
+        for idx in range(0, len(repos), self.REPOS_PER_QUERY):
+            batch = repos[idx:idx + self.REPOS_PER_QUERY]
+            data = self._query(*self._build_query(batch))
+            if data is None:
+                continue
+
+            for alias_idx, (owner, name) in enumerate(batch):
+                repository = data.get('repo{}'.format(alias_idx))
+                if repository is None:
+                    continue
+                statuses[(owner, name)] = self._repository_status(owner, name, repository)
+
+        return statuses
+
+    def _build_query(self, repos: List[Tuple[str, str]]) -> Tuple[str, Dict[str, str]]:
+        declarations = []
+        fragments = []
+        variables = {}
+        for idx, (owner, name) in enumerate(repos):
+            declarations.append('$owner{0}: String!, $name{0}: String!'.format(idx))
+            fragments.append(self._REPOSITORY_FRAGMENT.format(idx=idx, prs=self.PULL_REQUESTS_PER_REPO))
+            variables['owner{}'.format(idx)] = owner
+            variables['name{}'.format(idx)] = name
+
+        query = 'query({}) {{{}\n}}'.format(', '.join(declarations), ''.join(fragments))
+        return query, variables
+
+    @staticmethod
+    def _repository_status(owner: str, name: str, repository: Mapping[str, Any]) -> RepositoryStatus:
+        pull_requests = repository['pullRequests']
+        return RepositoryStatus(
+            owner=owner,
+            name=name,
+            pr_count=pull_requests['totalCount'],
+            pull_requests=[PullRequestStatus(
+                mergeable=_MERGEABLE.get(pr['mergeable']),
+                review_count=pr['reviews']['totalCount'],
+                changes_requested=pr['changesRequested']['totalCount'] > 0
+            ) for pr in pull_requests['nodes']]
+        )
+
+    def _query(self, query: str, variables: Mapping[str, str]) -> Optional[Mapping[str, Any]]:
+        res = self.client.post(self.URL, json={'query': query, 'variables': variables},
+                               headers={'Authorization': 'bearer {}'.format(self.token)})
+        if 200 <= res.status_code < 400:
+            # missing repositories come back as errors alongside the data for the others
+            return json_backend.loads(res.content).get('data')
+
+        return None
@@ -0,0 +1,8 @@
+# gunicorn settings for the web process, see the Procfile
+
+
+def post_fork(server, worker):
+    # the gevent workers hold status streams open between queries. psycopg2 would block the whole worker, and every
+    # stream on it, while it waits for the database, unless it yields to the other greenlets
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
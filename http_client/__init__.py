@@ -0,0 +1,246 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Iterable, Optional, Tuple, Union, Callable, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from json_object import json_backend
+from .cache import ConditionalCache, fingerprint
+from .coalesce import Coalescer
+
+Timeout = Union[float, Tuple[float, float]]
+
+# called after every request with the client name, method, url, response status (None if the request failed) and the
+# elapsed time in seconds
+Observer = Callable[[str, str, str, Optional[int], float], None]
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClient:
+    """
+    Wrapper around a pooled, keep-alive requests Session. A client is meant to be shared by every service instance
+    that talks to the same upstream, so connections are reused across accounts instead of paying a TCP and TLS
+    handshake per request. Each process (ie, each forked Celery worker) lazily gets its own Session.
+
+    Idempotent requests (GET, HEAD, etc) are retried with exponential backoff on connection errors and on 429 and 5xx
+    responses, as are requests with any of retry_methods - ie POST, for an upstream whose POSTs are read-only queries.
+    Every request gets a timeout unless the caller passes one.
+
+    If an observer is set, it is told the latency of every request (including retries), for instrumentation.
+
+    The body of a response requested with stream=True is left on the connection, and handed over once as
+    res.body_stream, a file-like object of the decoded body, for decoders that can stream it (see
+    Projection.from_response). A decoder that takes it sets it to None; otherwise it is read in full as usual.
+
+    get_cached makes conditional requests, returning the previously parsed body when the upstream answers
+    304 Not Modified. It also coalesces identical GETs: callers asking for the same url with the same credential while
+    a request is in flight (or, with a coalesce_window, shortly after it completed) share its result.
+
+    get_shared goes further: if a shared store is set (anything with get/set/add/delete_if, ie the app's store), it
+    coalesces across processes and hosts, between every caller that passes the same url and credential.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    # how long a get_shared request may run before the callers waiting on it give up and make their own
+    SHARED_LOCK_TTL = 30
+    # how often callers waiting on another process' get_shared request check for its result, in seconds
+    SHARED_POLL_INTERVAL = 0.05
+
+    def __init__(self, name: str, pool_size: int = 10, timeout: Timeout = (3.05, 10), retries: int = 3,
+                 backoff_factor: float = 0.3, coalesce_window: float = 0.0, observer: Optional[Observer] = None,
+                 shared=None, retry_methods: Iterable[str] = ()):
+        self.name = name
+        self.observer = observer
+        self.shared = shared
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.retry_methods = frozenset(method.upper() for method in retry_methods)
+
+        self.cache = ConditionalCache()
+        self.coalescer = Coalescer(coalesce_window)
+
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._pid = None
+
+    def configure(self, pool_size: int = None, timeout: Timeout = None, retries: int = None,
+                  backoff_factor: float = None, coalesce_window: float = None):
+        """
+        Changes the client's settings. Settings that are None are left unchanged. The pooled session is rebuilt the
+        next time it is used.
+        """
+        with self._lock:
+            if pool_size is not None:
+                self.pool_size = pool_size
+            if timeout is not None:
+                self.timeout = timeout
+            if retries is not None:
+                self.retries = retries
+            if backoff_factor is not None:
+                self.backoff_factor = backoff_factor
+            if coalesce_window is not None:
+                self.coalescer.window = coalesce_window
+            self._session = None
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                self._session = self._new_session()
+                self._pid = os.getpid()
+            return self._session
+
+    def _new_session(self) -> requests.Session:
+        retry_kwargs = {}
+        if self.retry_methods:
+            # urllib3 < 1.26 calls allowed_methods method_whitelist
+            if hasattr(Retry, 'DEFAULT_ALLOWED_METHODS'):
+                retry_kwargs['allowed_methods'] = Retry.DEFAULT_ALLOWED_METHODS | self.retry_methods
+            else:
+                retry_kwargs['method_whitelist'] = Retry.DEFAULT_METHOD_WHITELIST | self.retry_methods
+
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            raise_on_status=False,
+            **retry_kwargs
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def get_cached(self, url: str, parse: Callable[[requests.Response], T], credential: Optional[str] = None,
+                   **kwargs) -> T:
+        """
+        GETs url, using the ETag or Last-Modified of the last successful response for the same url and credential to
+        make the request conditional. On a 304 the value parse returned for the cached response is returned as is,
+        without parsing anything.
+
+        Concurrent calls for the same url and credential are coalesced into a single request, so callers of the same
+        url are expected to pass the same parse function.
+
+        :param url: the url to get
+        :param parse: turns a response into the value to return. Called for every response other than a cached 304
+        :param credential: whatever identifies the caller's access (ie, its token). Responses are only shared between
+        callers with the same credential
+        :return: the parsed value
+        """
+        key = (url, fingerprint(credential))
+        return self.coalescer.run(key, lambda: self._get_conditional(key, url, parse, **kwargs))
+
+    def get_shared(self, url: str, decode: Callable[[requests.Response], Any], credential: str, **kwargs) -> Any:
+        """
+        Like get_cached, but the result is shared through the shared store with every caller, in any process, that
+        asks for the same url with the same credential while a request is in flight or within coalesce_window seconds
+        of it completing. Without a shared store or a window, it is only shared within the process.
+
+        :param decode: turns a response into a JSON serializable value, or None for a response that must not be shared
+        (ie, an error)
+        :param credential: whatever identifies the caller's access (ie, its token). Only its fingerprint is stored
+        """
+        if self.shared is None or self.coalescer.window <= 0:
+            return self.get_cached(url, decode, credential=credential, **kwargs)
+
+        key = 'http:{}:{}:{}'.format(self.name, fingerprint(credential), fingerprint(url))
+        return self.coalescer.run(key, lambda: self._get_shared(key, url, decode, credential, **kwargs))
+
+    def _get_shared(self, key: str, url: str, decode: Callable[[requests.Response], Any], credential: str,
+                    **kwargs) -> Any:
+        lock_key = key + ':lock'
+        owner = '{}:{}'.format(os.getpid(), threading.get_ident())
+        deadline = time.monotonic() + self.SHARED_LOCK_TTL
+
+        # wait for another process that is already making the request, unless it takes too long
+        while True:
+            cached = self.shared.get(key)
+            if cached is not None:
+                return json_backend.loads(cached)
+            if self.shared.add(lock_key, owner, self.SHARED_LOCK_TTL) or time.monotonic() >= deadline:
+                break
+            time.sleep(self.SHARED_POLL_INTERVAL)
+
+        try:
+            value = self.get_cached(url, decode, credential=credential, **kwargs)
+            if value is not None:
+                self.shared.set(key, json_backend.dumps(value), self.coalescer.window)
+            return value
+        finally:
+            self.shared.delete_if(lock_key, owner)
+
+    def _get_conditional(self, key, url: str, parse: Callable[[requests.Response], T], **kwargs) -> T:
+        entry = self.cache.get(key)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        res = self.get(url, headers=headers, **kwargs)
+        try:
+            if res.status_code == 304 and entry is not None:
+                # reading the (empty) body of a streamed 304 returns its connection to the pool
+                res.content
+                return entry.value
+
+            value = parse(res)
+        finally:
+            # releases the connection, even if parse didn't read a streamed body
+            res.close()
+
+        etag = res.headers.get('ETag')
+        last_modified = res.headers.get('Last-Modified')
+        if 200 <= res.status_code < 300 and (etag or last_modified):
+            self.cache.put(key, etag, last_modified, value)
+
+        return value
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        if kwargs.get('json') is not None:
+            # encoded with the configured JSON backend rather than by requests
+            kwargs['data'] = json_backend.dumps_bytes(kwargs.pop('json'))
+            kwargs['headers'] = dict(kwargs.get('headers') or {})
+            kwargs['headers'].setdefault('Content-Type', 'application/json')
+
+        status = None
+        start = time.perf_counter()
+        try:
+            res = self.session.request(method, url, **kwargs)
+            status = res.status_code
+            res.body_stream = None
+            if kwargs.get('stream'):
+                res.raw.decode_content = True
+                res.body_stream = res.raw
+            return res
+        finally:
+            if self.observer:
+                self._observe(method, url, status, time.perf_counter() - start)
+
+    def _observe(self, method: str, url: str, status: Optional[int], elapsed: float):
+        try:
+            self.observer(self.name, method, url, status, elapsed)
+        except Exception:
+            # instrumentation must never fail (or replace the error of) the request it measures
+            logger.exception('Observer of HTTP client %s failed', self.name)
@@ -0,0 +1,51 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Optional, Tuple, Any
+
+# value is the parsed response body, as returned by the parse function passed to HTTPClient.get_cached
+CacheEntry = namedtuple('CacheEntry', 'etag last_modified value')
+
+CacheKey = Tuple[str, str]
+
+
+def fingerprint(credential: Optional[str]) -> str:
+    """
+    A stable, non-reversible stand in for a credential, so cache keys never hold the credential itself.
+    """
+    if not credential:
+        return ''
+    return hashlib.sha256(credential.encode('utf-8')).hexdigest()
+
+
+class ConditionalCache:
+    """
+    Thread safe LRU cache of validators (ETag / Last-Modified) and parsed bodies, keyed by URL and credential
+    fingerprint. Responses fetched with different credentials are cached separately, since they may differ.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: CacheKey, etag: Optional[str], last_modified: Optional[str], value: Any):
+        with self._lock:
+            self._entries[key] = CacheEntry(etag, last_modified, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,59 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class Coalescer:
+    """
+    Collapses identical concurrent calls into one. While a call for a key is in flight, other callers for the same
+    key wait for it and share its result instead of making their own. If window is set, a completed result is also
+    reused for that many seconds, so accounts polled a little apart within the same cycle still share a request.
+
+    Failures are shared with the callers that were waiting, but are never reused afterwards.
+    """
+
+    def __init__(self, window: float = 0.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._recent: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def run(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent is not None and recent[0] > time.monotonic():
+                return recent[1]
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            if self.window > 0:
+                self._expire()
+                self._recent[key] = (time.monotonic() + self.window, value)
+        future.set_result(value)
+        return value
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._recent.items() if expires <= now]:
+            del self._recent[key]
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
@@ -1,8 +1,33 @@
 import keyword
 from collections import abc
 
+from . import backend as json_backend
+from .projection import Projection
+
+# stands in for keys that aren't in the wrapped dict (None is a valid key)
+_MISSING = object()
+
+
+def _normalize_key(key):
+    if isinstance(key, str):
+        key = key.replace('/', '_')
+        if keyword.iskeyword(key):
+            key += '_'
+    return key
+
 
 class JSONObject:
+    """
+    Attribute access over a decoded JSON object: obj.name is obj['name'], with nested objects (and lists of objects)
+    wrapped in turn. Keys that aren't valid attribute names are exposed normalized - '/' becomes '_', and keywords get a
+    trailing '_' (ie 'requests/count' is requests_count, and 'class' is class_).
+
+    The wrapped dict is used as is rather than copied. Wrappers for nested values are created on first access and
+    cached, so repeated access returns the same object, and the normalized key map is only built the first time a key
+    needs it.
+    """
+    __slots__ = ('_raw', '_keys', '_children')
+
     def __new__(cls, arg):
         if isinstance(arg, abc.Mapping):
             return super().__new__(cls)
@@ -12,24 +37,54 @@ class JSONObject:
             return arg
 
     def __init__(self, wrapped):
-        self._data = {}
+        self._raw = wrapped
+        # normalized key -> raw key, for the keys that differ. Built on demand
+        self._keys = None
+        self._children = {}
+
+    def _raw_key(self, item):
+        # most keys are already valid names, and can be looked up directly
+        if item in self._raw and _normalize_key(item) == item:
+            return item
 
-        for key, value in wrapped.items():
-            if isinstance(key, str):
-                key = key.replace('/', '_')
-                if keyword.iskeyword(key):
-                    key += '_'
-            self._data[key] = value
+        if self._keys is None:
+            self._keys = {}
+            for key in self._raw:
+                normalized = _normalize_key(key)
+                if normalized != key:
+                    self._keys[normalized] = key
+
+        return self._keys.get(item, _MISSING)
+
+    def _normalized(self):
+        return {_normalize_key(key): value for key, value in self._raw.items()}
 
     def __getattr__(self, item):
-        if item in self.__dict__:
-            return self.__dict__[item]
-        if hasattr(self._data, item):
-            return getattr(self._data, item)
-        return JSONObject(self._data[item])
+        if item in JSONObject.__slots__:
+            # only reached if __init__ hasn't run
+            raise AttributeError(item)
+
+        try:
+            return self._children[item]
+        except KeyError:
+            pass
+
+        # dict methods (ie items, get) are passed through, as views over the normalized keys
+        if hasattr(self._raw, item):
+            return getattr(self._normalized(), item)
+
+        key = self._raw_key(item)
+        if key is _MISSING:
+            raise KeyError(item)
+
+        child = self._children[item] = JSONObject(self._raw[key])
+        return child
 
     def __getitem__(self, item):
-        return self._data[item]
+        key = self._raw_key(item)
+        if key is _MISSING:
+            raise KeyError(item)
+        return self._raw[key]
 
     def __contains__(self, item):
-        return item in self._data
+        return self._raw_key(item) is not _MISSING
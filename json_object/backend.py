@@ -0,0 +1,119 @@
+"""
+The JSON library used to encode and decode JSON, chosen with configure(). orjson and ujson are used when installed;
+the stdlib json module is always available as a fallback, both when a library is missing and for values a faster
+library refuses to encode.
+"""
+import json
+import logging
+from typing import Any, Callable, Dict, Union
+
+logger = logging.getLogger(__name__)
+
+
+class JSONBackend:
+    def __init__(self, name: str, dumps: Callable[[Any], str], dumps_bytes: Callable[[Any], bytes],
+                 loads: Callable[[Union[str, bytes]], Any]):
+        self.name = name
+        self._dumps = dumps
+        self._dumps_bytes = dumps_bytes
+        self.loads = loads
+
+    def dumps(self, obj: Any, fallback: Callable[[Any], str] = None) -> str:
+        """
+        :param fallback: encodes the values the library refuses to (ie unsupported types or integer sizes). Defaults
+        to the stdlib backend
+        """
+        try:
+            return self._dumps(obj)
+        except (TypeError, OverflowError):
+            return (fallback or STDLIB.dumps)(obj)
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        try:
+            return self._dumps_bytes(obj)
+        except (TypeError, OverflowError):
+            return STDLIB.dumps_bytes(obj)
+
+    def __repr__(self):
+        return 'JSONBackend({!r})'.format(self.name)
+
+
+def _stdlib_dumps(obj: Any) -> str:
+    return json.dumps(obj, separators=(',', ':'))
+
+
+STDLIB = JSONBackend('json', _stdlib_dumps, lambda obj: _stdlib_dumps(obj).encode('utf-8'), json.loads)
+
+
+def _orjson() -> JSONBackend:
+    import orjson
+    return JSONBackend('orjson', lambda obj: orjson.dumps(obj).decode('utf-8'), orjson.dumps, orjson.loads)
+
+
+def _ujson() -> JSONBackend:
+    import ujson
+
+    def dumps(obj: Any) -> str:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+
+    return JSONBackend('ujson', dumps, lambda obj: dumps(obj).encode('utf-8'), ujson.loads)
+
+
+# in order of preference, for 'auto'
+_FACTORIES: Dict[str, Callable[[], JSONBackend]] = {
+    'orjson': _orjson,
+    'ujson': _ujson,
+    'json': lambda: STDLIB,
+}
+
+
+def available(name: str) -> bool:
+    try:
+        _FACTORIES[name]()
+        return True
+    except (ImportError, KeyError):
+        return False
+
+
+def select(name: str = 'auto') -> JSONBackend:
+    """
+    :param name: 'orjson', 'ujson' or 'json', or 'auto' for the fastest one installed
+    :return: the named backend, or the stdlib backend if it isn't installed
+    """
+    names = list(_FACTORIES) if name in (None, 'auto') else [name]
+    for candidate in names:
+        try:
+            return _FACTORIES[candidate]()
+        except ImportError:
+            continue
+        except KeyError:
+            logger.warning('Unknown JSON backend %s', candidate)
+
+    if name not in (None, 'auto'):
+        logger.warning('JSON backend %s is not available, falling back to the json module', name)
+    return STDLIB
+
+
+_current = select()
+
+
+def configure(name: str = 'auto') -> JSONBackend:
+    global _current
+    _current = select(name)
+    return _current
+
+
+def current() -> JSONBackend:
+    return _current
+
+
+def dumps(obj: Any) -> str:
+    return _current.dumps(obj)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    return _current.dumps_bytes(obj)
+
+
+def loads(s: Union[str, bytes]) -> Any:
+    return _current.loads(s)
@@ -0,0 +1,151 @@
+import sys
+from typing import Any, Dict, Iterable, Mapping, Optional, BinaryIO
+
+from . import backend as json_backend
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - streaming is optional, and falls back to decoding the whole body
+    ijson = None
+
+# a node of the projection tree. None keeps the whole value
+Node = Optional[Dict[str, Any]]
+
+
+class Projection:
+    """
+    The fields of a JSON document that are actually read, as dotted paths, ie 'releases.environments.status'. Lists
+    are transparent - a path applies to every item of a list it passes through - and a path that ends at an object or
+    list keeps all of it.
+
+    Projected documents hold only those fields, so the rest of a large upstream response is not kept around. Responses
+    larger than STREAM_THRESHOLD are decoded with a streaming parser (when ijson is installed), which skips the fields
+    that aren't projected instead of building them.
+    """
+
+    # bodies larger than this (or of unknown length) are streamed. Streaming takes about twice as long as decoding the
+    # whole body; by benchmarks.projection_benchmark, it doesn't lower peak memory for bodies of ~100 KiB, and lowers
+    # it by 70% or more from ~500 KiB up
+    STREAM_THRESHOLD = 512 * 1024
+    # the Content-Length of a compressed body is its compressed size. JSON listings compress at least this well, so a
+    # compressed body is streamed once it is larger than STREAM_THRESHOLD / COMPRESSION_RATIO
+    COMPRESSION_RATIO = 4
+
+    def __init__(self, *paths: str):
+        self.paths = paths
+        self.tree: Dict[str, Any] = {}
+        for path in paths:
+            node = self.tree
+            keys = path.split('.')
+            for key in keys[:-1]:
+                child = node.setdefault(sys.intern(key), {})
+                if child is None:
+                    break
+                node = child
+            else:
+                node[sys.intern(keys[-1])] = None
+
+    def apply(self, value: Any) -> Any:
+        """
+        Prunes an already decoded document down to the projected fields.
+        """
+        return self._apply(value, self.tree)
+
+    def _apply(self, value: Any, node: Node) -> Any:
+        if node is None:
+            return value
+        if isinstance(value, list):
+            return [self._apply(item, node) for item in value]
+        if isinstance(value, dict):
+            return {key: self._apply(value[key], child) for key, child in node.items() if key in value}
+        return value
+
+    def load(self, fp: BinaryIO) -> Any:
+        """
+        Decodes a document from a file-like object with the streaming parser, only building the projected fields.
+        """
+        if ijson is None:
+            raise RuntimeError('ijson is required to stream JSON')
+        return _build(ijson.basic_parse(fp, use_float=True), self.tree)
+
+    def from_response(self, res) -> Any:
+        """
+        Decodes the body of a requests Response. The body is streamed if it is large and the response still has its
+        body_stream, which HTTPClient hands over for responses requested with stream=True; otherwise it is decoded in
+        full and then projected.
+        """
+        fp = getattr(res, 'body_stream', None)
+        if ijson is not None and fp is not None and self.is_large(res.headers):
+            res.body_stream = None
+            return self.load(fp)
+
+        return self.apply(json_backend.loads(res.content))
+
+    def is_large(self, headers: Mapping[str, str]) -> bool:
+        length = headers.get('Content-Length')
+        if length is None:
+            return True
+        ratio = self.COMPRESSION_RATIO if headers.get('Content-Encoding', 'identity') != 'identity' else 1
+        return int(length) * ratio > self.STREAM_THRESHOLD
+
+
+def _build(events: Iterable, tree: Dict[str, Any]) -> Any:
+    # each frame is [container, projection node, current key]
+    stack = []
+    result = None
+    skip = 0
+    skip_next = False
+
+    def add(value: Any):
+        nonlocal result
+        if not stack:
+            result = value
+            return
+        container, _, key = stack[-1]
+        if isinstance(container, list):
+            container.append(value)
+        else:
+            container[key] = value
+
+    def child_node() -> Node:
+        if not stack:
+            return tree
+        _, node, key = stack[-1]
+        if node is None:
+            return None
+        if isinstance(stack[-1][0], list):
+            return node
+        return node[key]
+
+    for event, value in events:
+        if skip:
+            if event in ('start_map', 'start_array'):
+                skip += 1
+            elif event in ('end_map', 'end_array'):
+                skip -= 1
+            continue
+
+        if skip_next:
+            skip_next = False
+            if event in ('start_map', 'start_array'):
+                skip = 1
+            continue
+
+        if event == 'map_key':
+            node = stack[-1][1]
+            if node is not None and value not in node:
+                skip_next = True
+            else:
+                # the streaming parser makes a new string for every key, unlike json.loads
+                stack[-1][2] = sys.intern(value)
+        elif event in ('start_map', 'start_array'):
+            container = {} if event == 'start_map' else []
+            node = child_node()
+            add(container)
+            stack.append([container, node, None])
+        elif event in ('end_map', 'end_array'):
+            stack.pop()
+        else:
+            add(value)
+
+    return result
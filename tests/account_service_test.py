@@ -1,7 +1,9 @@
+from datetime import datetime, timedelta
+
 import pytest
 
-from ambrose.models import ApplicationInsightsAccount, DevOpsAccount
-from ambrose.services import DevOpsAccountService, ApplicationInsightsAccountService, AccountService
+from ambrose.models import db, Task, ApplicationInsightsAccount, DevOpsAccount, ApplicationInsightsMetricTask, Gauge
+from ambrose.services import DevOpsAccountService, ApplicationInsightsAccountService, AccountService, UserService
 
 
 def test_new_account(devops_account, token):
@@ -13,4 +15,62 @@ def test_new_account(devops_account, token):
 ])
 def test_new_service(model, expected_service_type):
     service = AccountService(model())
-    assert isinstance(service, expected_service_type)
\ No newline at end of file
+    assert isinstance(service, expected_service_type)
+
+
+def test_tasks_to_poll(user, appinsights_account, cipher):
+    hidden = ApplicationInsightsMetricTask(metric='requests/count')
+    displayed = ApplicationInsightsMetricTask(metric='requests/count')
+    always = ApplicationInsightsMetricTask(metric='requests/count', always_poll=True)
+    for task in (hidden, displayed, always):
+        appinsights_account.add_task(task)
+    db.session.commit()
+
+    user.add_gauge(Gauge(min_val=0, max_val=10, task_id=displayed.id))
+    db.session.commit()
+
+    tasks = ApplicationInsightsAccountService(appinsights_account, cipher).tasks_to_poll
+
+    assert displayed in tasks
+    assert always in tasks
+    assert hidden not in tasks
+
+
+def test_poll_backs_off_when_fetching_statuses_fails(appinsights_account, cipher, monkeypatch):
+    due = ApplicationInsightsMetricTask(metric='requests/count', always_poll=True, poll_interval=120)
+    appinsights_account.add_task(due)
+    db.session.commit()
+
+    def get_task_statuses(self):
+        raise RuntimeError('upstream unavailable')
+
+    monkeypatch.setattr(ApplicationInsightsAccountService, 'get_task_statuses', get_task_statuses)
+    before = datetime.now()
+    with pytest.raises(RuntimeError):
+        ApplicationInsightsAccountService(appinsights_account, cipher).poll()
+
+    assert due.poll_interval == 240
+    assert due.next_poll_at >= before + timedelta(seconds=240)
+
+    appinsights_account.remove_task(due)
+    db.session.commit()
+
+
+def test_touch_tasks_leaves_due_tasks_alone(user, appinsights_account):
+    now = datetime.now()
+    due = ApplicationInsightsMetricTask(metric='requests/count', poll_interval=240, next_poll_at=now)
+    scheduled = ApplicationInsightsMetricTask(metric='requests/count', poll_interval=240,
+                                              next_poll_at=now + timedelta(hours=1))
+    for task in (due, scheduled):
+        appinsights_account.add_task(task)
+    db.session.commit()
+
+    UserService(user).touch_tasks([due, scheduled])
+
+    assert (due.poll_interval, due.next_poll_at) == (240, now)
+    assert scheduled.poll_interval == Task.BASE_POLL_INTERVAL
+    assert scheduled.is_due(datetime.now())
+
+    for task in (due, scheduled):
+        appinsights_account.remove_task(task)
+    db.session.commit()
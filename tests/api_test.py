@@ -33,6 +33,15 @@ def test_login(client, user, password):
     assert resp.json.get('access_token') is not None
 
 
+def test_login_is_pretty_printed_when_configured(app, client, user, password, monkeypatch):
+    monkeypatch.setitem(app.config, 'JSONIFY_PRETTYPRINT_REGULAR', True)
+
+    resp = client.post('/api/login', json={'username': user.username, 'password': password})
+
+    assert resp.status_code == 200
+    assert resp.data.decode('utf-8').startswith('{\n  "access_token": ')
+
+
 def test_delete_message(client, user, access_token):
     message = TextMessage(text='Hello', user_id=user.id)
     db.session.add(message)
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from ambrose.models import db, ApplicationInsightsMetricTask
+from ambrose.services import ApplicationInsightsAccountService
+from application_insights import ApplicationInsightsService, MetricQuery
+
+
+def metric_result(query_id, metric, aggregation, value):
+    return {
+        'id': query_id,
+        'status': 200,
+        'body': {
+            'value': {
+                'start': '2019-07-01T12:00:00.000Z',
+                'end': '2019-07-01T13:00:00.000Z',
+                metric: {aggregation: value}
+            }
+        }
+    }
+
+
+@pytest.fixture
+def insights_server(stub_server, monkeypatch):
+    monkeypatch.setattr(ApplicationInsightsService, 'BASE_URL_TEMPLATE', stub_server.url + '/v1/apps/{}/')
+    return stub_server
+
+
+def test_get_metrics_batches_queries(insights_server, monkeypatch):
+    monkeypatch.setattr(ApplicationInsightsService, 'BATCH_SIZE', 2)
+    insights_server.respond('/v1/apps/app/metrics', [
+        metric_result('a', 'requests/count', 'sum', 10),
+        metric_result('b', 'requests/failed', 'sum', 1),
+    ])
+    insights_server.respond('/v1/apps/app/metrics', [
+        {'id': 'c', 'status': 400, 'body': {'error': {'message': 'bad metric'}}},
+    ])
+    service = ApplicationInsightsService('app', 'key')
+
+    metrics = service.get_metrics([
+        MetricQuery('a', 'requests/count', 'sum', 'PT1H'),
+        MetricQuery('b', 'requests/failed', 'sum', None),
+        MetricQuery('c', 'requests/unknown', None, None),
+    ])
+
+    assert len(insights_server.requests) == 2
+    assert metrics['a'].value == 10
+    assert metrics['b'].value == 1
+    assert 'c' not in metrics
+
+    method, path, headers, body = insights_server.requests[0]
+    assert method == 'POST'
+    assert headers['x-api-key'] == 'key'
+    assert json.loads(body) == [
+        {'id': 'a', 'parameters': {'metricId': 'requests/count', 'aggregation': 'sum', 'timespan': 'PT1H'}},
+        {'id': 'b', 'parameters': {'metricId': 'requests/failed', 'aggregation': 'sum'}},
+    ]
+
+
+def test_get_metrics_retries_unavailable_batch(insights_server):
+    insights_server.respond('/v1/apps/app/metrics', status=503)
+    insights_server.respond('/v1/apps/app/metrics', [metric_result('a', 'requests/count', 'sum', 10)])
+    service = ApplicationInsightsService('app', 'key')
+
+    metrics = service.get_metrics([MetricQuery('a', 'requests/count', 'sum', None)])
+
+    assert [method for method, *_ in insights_server.requests] == ['POST', 'POST']
+    assert metrics['a'].value == 10
+
+
+def test_get_task_statuses_uses_one_request(insights_server, appinsights_account, cipher):
+    tasks = [ApplicationInsightsMetricTask(metric='requests/count', aggregation='sum', always_poll=True)
+             for _ in range(3)]
+    for task in tasks:
+        appinsights_account.add_task(task)
+    db.session.commit()
+
+    application_id = appinsights_account.application_id
+    insights_server.respond('/v1/apps/{}/metrics'.format(application_id), [
+        metric_result(str(t.id), 'requests/count', 'sum', idx) for idx, t in enumerate(tasks)
+    ])
+
+    ApplicationInsightsAccountService(appinsights_account, cipher).get_task_statuses()
+
+    assert len(insights_server.requests) == 1
+    assert [t.value for t in tasks] == ['0', '1', '2']
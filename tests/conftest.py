@@ -1,3 +1,8 @@
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
 import pytest
 from cryptography.fernet import Fernet
 from faker import Faker
@@ -97,3 +102,69 @@ def text_message(user, faker):
 
     db.session.delete(msg)
     db.session.commit()
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local HTTP server standing in for upstream APIs. Responses are queued per path with respond(); the last response
+    queued for a path is repeated once the others are used up. Every request and client connection is recorded.
+    """
+    daemon_threads = True
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _handle(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(length) if length else b''
+            self.server.requests.append((self.command, self.path, dict(self.headers), body))
+            self.server.connections.add(self.client_address)
+
+            status, payload, headers, delay = self.server.next_response(self.path)
+            time.sleep(delay)
+            self.send_response(status)
+            for key, val in headers.items():
+                self.send_header(key, val)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = _handle
+        do_POST = _handle
+
+        def log_message(self, format, *args):
+            pass
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), self.Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+        self.requests = []
+        self.connections = set()
+        self._responses = {}
+        self._lock = threading.Lock()
+
+    def respond(self, path, body=None, status=200, headers=None, delay=0):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        headers = dict(headers or {})
+        if body is not None:
+            headers.setdefault('Content-Type', 'application/json')
+        self._responses.setdefault(path, []).append((status, payload, headers, delay))
+
+    def next_response(self, path):
+        with self._lock:
+            responses = self._responses.get(path.split('?')[0]) or self._responses.get(path)
+            if not responses:
+                return 404, b'', {}, 0
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+
+@pytest.fixture
+def stub_server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,218 @@
+import base64
+
+import pytest
+
+from ambrose.common import store
+from ambrose.models import db, DevOpsReleaseTask, DevOpsBuildTask
+from ambrose.services import DevOpsAccountService
+from devops import DevOpsService, DevOpsRequestException
+from devops.devops_json import ReleaseList, ReleaseSummary, BuildSummary, DevOpsProjects
+
+
+def requests_auth(username, token):
+    return 'Basic ' + base64.b64encode('{}:{}'.format(username, token).encode('utf-8')).decode('ascii')
+
+
+def release(release_id, definition_id, *environments):
+    return {
+        'id': release_id,
+        'name': 'Release-{}'.format(release_id),
+        'releaseDefinition': {'id': definition_id, 'name': 'pipeline-{}'.format(definition_id)},
+        'environments': [{'id': release_id * 100 + env_id, 'definitionEnvironmentId': env_id, 'name': 'env',
+                          'status': status} for env_id, status in environments]
+    }
+
+
+@pytest.fixture
+def devops_server(stub_server, monkeypatch):
+    monkeypatch.setattr(DevOpsService, 'BASE_URL_TEMPLATE', stub_server.url + '/{}{}/{}/_apis/')
+    return stub_server
+
+
+def release_paths(server):
+    return [path for _, path, _, _ in server.requests if '/_apis/release/' in path]
+
+
+def test_release_list_status_for_environment():
+    releases = ReleaseList({'value': [
+        release(3, 1, (10, 'notStarted'), (11, 'inProgress')),
+        release(2, 1, (10, 'succeeded'), (11, 'succeeded')),
+        release(1, 2, (20, 'rejected')),
+    ]})
+
+    assert releases.status_for_environment(10, 1) == 'succeeded'
+    assert releases.status_for_environment(11, 1) == 'inprogress'
+    assert releases.status_for_environment(20, 2) == 'failed'
+    assert releases.status_for_environment(20) == 'failed'
+    assert not releases.covers(3, 30)
+    assert releases.status_for_environment(30, 3) is None
+
+
+def test_update_release_statuses_uses_one_request_per_project(devops_server, devops_account, cipher):
+    tasks = [DevOpsReleaseTask(project='project', definition_id=definition_id, environment_id=env_id,
+                               pipeline='pipeline', environment='env', always_poll=True)
+             for definition_id, env_id in [(1, 10), (1, 11), (2, 20), (3, 30)]]
+    for task in tasks:
+        devops_account.add_task(task)
+    db.session.commit()
+
+    prefix = '/vsrm.{}/project/_apis/release'.format(devops_account.organization)
+    devops_server.respond(prefix + '/releases', {'value': [
+        release(2, 1, (10, 'succeeded'), (11, 'inProgress')),
+        release(1, 2, (20, 'rejected')),
+    ]})
+    devops_server.respond(prefix + '/releases', {
+        'releaseDefinition': {'id': 3, 'name': 'pipeline-3'},
+        'environments': [{'id': 30, 'lastReleases': [{'id': 5}]}],
+        'releases': [release(5, 3, (30, 'queued'))]
+    })
+
+    DevOpsAccountService(devops_account, cipher).update_release_statuses()
+
+    paths = release_paths(devops_server)
+    assert len(paths) == 2
+    # definition 3 hasn't been released recently, so it falls back to its own summary
+    assert 'definitionId=3' in paths[1]
+    assert [t.status for t in tasks] == ['succeeded', 'inprogress', 'failed', 'queued']
+
+    for task in tasks:
+        devops_account.remove_task(task)
+    db.session.commit()
+
+
+def test_release_listing_is_not_shared_between_credentials(devops_server):
+    devops_server.respond('/vsrm.org/project/_apis/release/releases', {'value': [release(1, 1, (10, 'succeeded'))]})
+    devops_server.respond('/vsrm.org/project/_apis/release/releases', status=401)
+
+    # both credentials can see the project, but not necessarily its releases
+    first = DevOpsService('first', 'token-1', 'org').list_releases('project')
+    second = DevOpsService('second', 'token-2', 'org').list_releases('project')
+
+    assert first.status_for_environment(10) == 'succeeded'
+    assert second is None
+    assert [headers['Authorization'] for _, path, headers, _ in devops_server.requests] == [
+        requests_auth('first', 'token-1'), requests_auth('second', 'token-2')]
+
+
+def test_release_listing_is_shared_by_accounts_with_the_same_credential(devops_server):
+    devops_server.respond('/vsrm.org/project/_apis/release/releases', {'value': [release(1, 1, (10, 'succeeded'))]})
+
+    for _ in range(2):
+        assert DevOpsService('user', 'token', 'org').list_releases('project').status_for_environment(10) == 'succeeded'
+
+    assert len(release_paths(devops_server)) == 1
+
+
+def test_discover_definitions_marks_slow_projects_incomplete(devops_server, devops_account, cipher, monkeypatch):
+    monkeypatch.setattr(DevOpsService, 'list_projects',
+                        lambda self: DevOpsProjects({'value': [{'name': 'fast'}, {'name': 'slow'}]}))
+    monitored = DevOpsBuildTask(project='slow', definition_id=7, pipeline='monitored')
+    devops_account.add_task(monitored)
+    db.session.commit()
+
+    org = devops_account.organization
+    devops_server.respond('/{}/fast/_apis/build/definitions'.format(org), {'value': [{'id': 1, 'name': 'build'}]})
+    devops_server.respond('/vsrm.{}/fast/_apis/release/definitions'.format(org), {'value': [
+        {'id': 2, 'name': 'release', 'environments': [{'id': 20, 'name': 'prod'}]}
+    ]})
+    devops_server.respond('/{}/slow/_apis/build/definitions'.format(org), {'value': []}, delay=1)
+    devops_server.respond('/vsrm.{}/slow/_apis/release/definitions'.format(org), {'value': []}, delay=1)
+
+    service = DevOpsAccountService(devops_account, cipher)
+    catalog = service.discover_definitions(timeout=0.5)
+    tasks = service.tasks_from_catalog(catalog)
+
+    assert catalog['incomplete'] == ['slow']
+    assert catalog['builds'] == [{'project': 'fast', 'definition_id': 1, 'pipeline': 'build'}]
+    assert tasks.incomplete == ['slow']
+    assert [(t.project, t.pipeline, t.current) for t in tasks.builds] == [('fast', 'build', False),
+                                                                          ('slow', 'monitored', True)]
+    assert [(t.project, t.environment) for t in tasks.releases] == [('fast', 'prod')]
+
+    devops_account.remove_task(monitored)
+    db.session.commit()
+
+
+def test_refresh_catalog_keeps_previous_definitions_of_incomplete_projects(devops_account, cipher, monkeypatch):
+    service = DevOpsAccountService(devops_account, cipher)
+    catalogs = [
+        {'builds': [{'project': 'slow', 'definition_id': 1, 'pipeline': 'build'}], 'releases': [], 'incomplete': []},
+        {'builds': [], 'releases': [], 'incomplete': ['slow']},
+    ]
+    monkeypatch.setattr(DevOpsAccountService, 'discover_definitions', lambda *args: catalogs.pop(0))
+
+    assert service.start_catalog_refresh(ttl=60)
+    assert not service.start_catalog_refresh(ttl=60)
+    service.refresh_catalog()
+    service.refresh_catalog()
+
+    catalog = service.cached_catalog()
+    assert catalog['builds'] == [{'project': 'slow', 'definition_id': 1, 'pipeline': 'build'}]
+    assert catalog['incomplete'] == ['slow']
+    assert service.catalog_progress() is None
+
+    store.delete(DevOpsAccountService.CATALOG_KEY.format(devops_account.id))
+
+
+def test_list_build_definitions_follows_continuation_token(devops_server):
+    devops_server.respond('/org/project/_apis/build/definitions', {'value': [{'id': 1, 'name': 'first'}]},
+                          headers={'x-ms-continuationtoken': 'next page'})
+    devops_server.respond('/org/project/_apis/build/definitions', {'value': [{'id': 2, 'name': 'second'}]})
+    service = DevOpsService('user', 'token', 'org')
+
+    definitions = service.list_build_definitions('project')
+    assert next(definitions).name == 'first'
+    assert len(devops_server.requests) == 1
+
+    assert [d.name for d in definitions] == ['second']
+    assert 'continuationToken=next%20page' in devops_server.requests[1][1]
+
+
+def test_listing_pages_are_not_cached(devops_server):
+    devops_server.respond('/org/project/_apis/build/definitions', {'value': [{'id': 1, 'name': 'first'}]},
+                          headers={'ETag': '"page"'})
+    service = DevOpsService('user', 'token', 'org')
+
+    assert [d.name for d in service.list_build_definitions('project')] == ['first']
+    assert [d.name for d in service.list_build_definitions('project')] == ['first']
+
+    assert len(devops_server.requests) == 2
+    assert not any('If-None-Match' in headers for _, _, headers, _ in devops_server.requests)
+
+
+def test_list_build_definitions_raises_on_failed_page(devops_server):
+    devops_server.respond('/org/project/_apis/build/definitions', status=500)
+    service = DevOpsService('user', 'token', 'org')
+
+    with pytest.raises(DevOpsRequestException):
+        list(service.list_build_definitions('project'))
+
+
+def test_release_summary_indexes_environments():
+    summary = ReleaseSummary({
+        'releaseDefinition': {'id': 1, 'name': 'my pipeline'},
+        'environments': [
+            {'id': 10, 'lastReleases': [{'id': 2}]},
+            {'id': 11, 'lastReleases': [{'id': 1}]},
+            {'id': 12, 'lastReleases': []},
+        ],
+        'releases': [release(2, 1, (10, 'inProgress'), (11, 'notStarted')), release(1, 1, (11, 'rejected'))]
+    })
+
+    assert summary.status_for_environment(10) == 'inprogress'
+    assert summary.status_for_environment(11) == 'failed'
+    assert summary.status_for_environment(12) is None
+    assert summary.environment_names() == ['my_pipeline_env', 'my_pipeline_env']
+    assert [s.current for s in summary.status().values()] == ['Release-1']
+
+
+def test_build_summary_indexes_definitions():
+    summary = BuildSummary({'value': [
+        {'definition': {'id': 1, 'name': 'first'}, 'status': 'completed', 'result': 'succeeded'},
+        {'definition': {'id': 2, 'name': 'second'}, 'status': 'inProgress'},
+    ]})
+
+    assert summary.status_for_definition(1) == 'succeeded'
+    assert summary.status_for_definition(2) == 'inprogress'
+    assert summary.status_for_definition(3) is None
+    assert summary.status()['second'].status == 'inprogress'
@@ -1,6 +1,11 @@
+import json
+from datetime import datetime
+
 import pytest
 
 import ambrose
+from ambrose import tasks
+from ambrose.common import store
 from ambrose.models import ApplicationInsightsMetricTask
 from ambrose.models.account import ApplicationInsightsAccount, DevOpsAccount
 
@@ -131,3 +136,89 @@ def test_post_new_appinsights_metric(client, user, appinsights_account, faker):
     assert new_task in appinsights_account.tasks
     assert new_task in user.tasks
 
+
+@pytest.mark.usefixtures('authenticated_user')
+def test_devops_tasks_queues_discovery(client, devops_account, monkeypatch):
+    queued = []
+    monkeypatch.setattr(tasks.refresh_devops_catalog, 'delay', queued.append)
+
+    resp = client.get('/web/accounts/{}/tasks'.format(devops_account.id))
+    client.get('/web/accounts/{}/tasks'.format(devops_account.id))
+
+    assert resp.status_code == 200
+    assert 'Discovering pipelines' in resp.data.decode('utf-8')
+    assert queued == [devops_account.id]
+
+    store.delete('devops:catalog:{}:progress'.format(devops_account.id))
+
+
+@pytest.mark.usefixtures('authenticated_user')
+def test_devops_tasks_renders_cached_catalog(client, devops_account, monkeypatch):
+    queued = []
+    monkeypatch.setattr(tasks.refresh_devops_catalog, 'delay', queued.append)
+    store.set('devops:catalog:{}'.format(devops_account.id), json.dumps({
+        'builds': [{'project': 'project', 'definition_id': 1, 'pipeline': 'cached-build'}],
+        'releases': [],
+        'incomplete': [],
+        'refreshed_at': datetime.now().isoformat()
+    }))
+
+    resp = client.get('/web/accounts/{}/tasks'.format(devops_account.id))
+
+    assert resp.status_code == 200
+    assert 'cached-build' in resp.data.decode('utf-8')
+    assert queued == []
+
+    resp = client.get('/web/accounts/{}/tasks/refresh'.format(devops_account.id))
+
+    assert resp.status_code == 302
+    assert queued == [devops_account.id]
+
+    store.delete('devops:catalog:{}'.format(devops_account.id))
+    store.delete('devops:catalog:{}:progress'.format(devops_account.id))
+
+
+@pytest.mark.usefixtures('authenticated_user')
+def test_devops_tasks_renders_stale_catalog_while_refreshing(client, devops_account, monkeypatch):
+    queued = []
+    monkeypatch.setattr(tasks.refresh_devops_catalog, 'delay', queued.append)
+    store.set('devops:catalog:{}'.format(devops_account.id), json.dumps({
+        'builds': [{'project': 'project', 'definition_id': 1, 'pipeline': 'stale-build'}],
+        'releases': [],
+        'incomplete': [],
+        'refreshed_at': '2019-07-01T12:00:00'
+    }))
+
+    resp = client.get('/web/accounts/{}/tasks'.format(devops_account.id))
+    body = resp.data.decode('utf-8')
+    client.get('/web/accounts/{}/tasks'.format(devops_account.id))
+
+    store.delete('devops:catalog:{}'.format(devops_account.id))
+    store.delete('devops:catalog:{}:progress'.format(devops_account.id))
+    assert resp.status_code == 200
+    assert 'stale-build' in body
+    assert 'Refreshing in the background' in body
+    # the form isn't reloaded from under the user while the refresh runs
+    assert 'http-equiv="refresh"' not in body
+    assert queued == [devops_account.id]
+
+
+def test_stale_catalogs_are_refreshed_periodically(devops_account, monkeypatch):
+    queued = []
+    monkeypatch.setattr(tasks.refresh_devops_catalog, 'delay', queued.append)
+    store.set('devops:catalog:{}'.format(devops_account.id), json.dumps({
+        'builds': [], 'releases': [], 'incomplete': [], 'refreshed_at': datetime.now().isoformat()
+    }))
+
+    tasks.refresh_stale_devops_catalogs()
+    fresh = list(queued)
+    store.set('devops:catalog:{}'.format(devops_account.id), json.dumps({
+        'builds': [], 'releases': [], 'incomplete': [], 'refreshed_at': '2019-07-01T12:00:00'
+    }))
+    tasks.refresh_stale_devops_catalogs()
+    tasks.refresh_stale_devops_catalogs()
+
+    store.delete('devops:catalog:{}'.format(devops_account.id))
+    store.delete('devops:catalog:{}:progress'.format(devops_account.id))
+    assert fresh == []
+    assert queued == [devops_account.id]
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from ambrose.models import db, GitHubRepositoryStatusTask
+from ambrose.services import GitHubAccountService
+from github_graphql import GitHubGraphQLService, PullRequestStatus
+
+
+def pull_request(mergeable='MERGEABLE', reviews=1, changes_requested=0):
+    return {
+        'mergeable': mergeable,
+        'reviews': {'totalCount': reviews},
+        'changesRequested': {'totalCount': changes_requested}
+    }
+
+
+def repository(*prs):
+    return {'pullRequests': {'totalCount': len(prs), 'nodes': list(prs)}}
+
+
+@pytest.fixture
+def github_server(stub_server, monkeypatch):
+    monkeypatch.setattr(GitHubGraphQLService, 'URL', stub_server.url + '/graphql')
+    return stub_server
+
+
+@pytest.fixture
+def github_account(user, cipher, faker):
+    account = GitHubAccountService(None, cipher).new_account(user, faker.sha1(), faker.word())
+
+    yield account
+
+    db.session.delete(account)
+    db.session.commit()
+
+
+def test_get_repository_statuses(github_server):
+    github_server.respond('/graphql', {
+        'data': {
+            'repo0': repository(pull_request(), pull_request(mergeable='UNKNOWN', reviews=0)),
+            'repo1': None
+        },
+        'errors': [{'type': 'NOT_FOUND', 'path': ['repo1']}]
+    })
+
+    statuses = GitHubGraphQLService('token').get_repository_statuses([('owner', 'repo'), ('owner', 'missing')])
+
+    assert len(github_server.requests) == 1
+    assert ('owner', 'missing') not in statuses
+    status = statuses[('owner', 'repo')]
+    assert status.pr_count == 2
+    assert status.pull_requests == [PullRequestStatus(True, 1, False), PullRequestStatus(None, 0, False)]
+
+    method, path, headers, body = github_server.requests[0]
+    assert headers['Authorization'] == 'bearer token'
+    assert json.loads(body)['variables'] == {'owner0': 'owner', 'name0': 'repo', 'owner1': 'owner', 'name1': 'missing'}
+
+
+@pytest.mark.parametrize('prs, expected', [
+    ([PullRequestStatus(True, 1, False)], 'open_prs'),
+    ([PullRequestStatus(True, 1, False), PullRequestStatus(True, 0, False)], 'prs_need_review'),
+    ([PullRequestStatus(True, 0, False), PullRequestStatus(False, 1, False)], 'prs_with_issues'),
+    ([PullRequestStatus(None, 1, False)], 'prs_with_issues'),
+    ([PullRequestStatus(True, 2, True)], 'prs_with_issues'),
+])
+def test_status_for_prs(prs, expected):
+    assert GitHubAccountService(None)._status_for_prs(prs) == expected
+
+
+def test_get_task_statuses(github_server, github_account, cipher):
+    tasks = [GitHubRepositoryStatusTask(owner='owner', repo_name=name, always_poll=True)
+             for name in ('quiet', 'busy')]
+    for task in tasks:
+        github_account.add_task(task)
+    db.session.commit()
+
+    github_server.respond('/graphql', {
+        'data': {
+            'repo0': repository(),
+            'repo1': repository(pull_request(), pull_request(reviews=0))
+        }
+    })
+
+    GitHubAccountService(github_account, cipher).get_task_statuses()
+
+    assert len(github_server.requests) == 1
+    assert [(t.status, t.pr_count) for t in tasks] == [('no_open_prs', 0), ('prs_need_review', 2)]
@@ -0,0 +1,241 @@
+from concurrent import futures
+
+import pytest
+import requests
+
+from ambrose.common import metrics
+from ambrose.common.store import Store
+from http_client import HTTPClient
+from http_client.coalesce import Coalescer
+
+
+def test_connections_are_reused(stub_server):
+    stub_server.respond('/status', {'status': 'ok'})
+    client = HTTPClient('test')
+
+    for _ in range(5):
+        assert client.get(stub_server.url + '/status').json() == {'status': 'ok'}
+
+    assert len(stub_server.requests) == 5
+    assert len(stub_server.connections) == 1
+
+
+def test_retries_with_backoff(stub_server):
+    stub_server.respond('/flaky', status=503)
+    stub_server.respond('/flaky', status=503)
+    stub_server.respond('/flaky', {'status': 'ok'})
+    client = HTTPClient('test', retries=3, backoff_factor=0)
+
+    res = client.get(stub_server.url + '/flaky')
+
+    assert res.status_code == 200
+    assert len(stub_server.requests) == 3
+
+
+def test_gives_up_after_retries(stub_server):
+    stub_server.respond('/down', status=503)
+    client = HTTPClient('test', retries=2, backoff_factor=0)
+
+    res = client.get(stub_server.url + '/down')
+
+    assert res.status_code == 503
+    assert len(stub_server.requests) == 3
+
+
+def test_configure_rebuilds_session():
+    client = HTTPClient('test')
+    session = client.session
+
+    client.configure(pool_size=2)
+
+    assert client.session is not session
+    assert client.pool_size == 2
+
+
+def test_timeout(stub_server):
+    stub_server.respond('/slow', {'status': 'ok'}, delay=0.5)
+    client = HTTPClient('test', timeout=(1, 0.1), retries=0)
+
+    with pytest.raises(requests.RequestException):
+        client.get(stub_server.url + '/slow')
+
+
+def test_observer_records_latency(stub_server):
+    stub_server.respond('/status', {'status': 'ok'})
+    stub_server.respond('/error', status=500)
+    observed = []
+    client = HTTPClient('test', retries=0, observer=lambda *args: observed.append(args))
+
+    client.get(stub_server.url + '/status')
+    client.get(stub_server.url + '/error')
+
+    assert [(name, method, status) for name, method, url, status, elapsed in observed] == [
+        ('test', 'GET', 200),
+        ('test', 'GET', 500)
+    ]
+    assert all(elapsed > 0 for *_, elapsed in observed)
+
+
+def test_failing_observer_does_not_fail_request(stub_server):
+    stub_server.respond('/status', {'status': 'ok'})
+
+    def observer(*args):
+        raise RuntimeError('metrics unavailable')
+
+    client = HTTPClient('test', retries=0, observer=observer)
+
+    assert client.get(stub_server.url + '/status').json() == {'status': 'ok'}
+    with pytest.raises(requests.ConnectionError):
+        client.get('http://127.0.0.1:1/unreachable')
+
+
+def test_metrics_record_request(app):
+    metrics.record_request('upstream', 'GET', 'https://example.com', 200, 0.1)
+    metrics.record_request('upstream', 'GET', 'https://example.com', None, 0.3)
+
+    assert metrics.get('http.upstream.count') == 2
+    assert metrics.get('http.upstream.errors') == 1
+    assert metrics.mean('http.upstream') == 200
+
+
+def test_streamed_not_modified_reuses_connection(stub_server):
+    stub_server.respond('/projects', {'count': 1}, headers={'ETag': '"v1"'})
+    stub_server.respond('/projects', status=304, headers={'ETag': '"v1"'})
+    client = HTTPClient('test', retries=0)
+
+    for _ in range(6):
+        assert client.get_cached(stub_server.url + '/projects', lambda res: res.json(), credential='token',
+                                 stream=True) == {'count': 1}
+
+    assert len(stub_server.requests) == 6
+    assert len(stub_server.connections) == 1
+
+
+def test_get_cached_reuses_value_on_not_modified(stub_server):
+    stub_server.respond('/projects', {'count': 1}, headers={'ETag': '"v1"'})
+    stub_server.respond('/projects', status=304, headers={'ETag': '"v1"'})
+    client = HTTPClient('test', retries=0)
+    parsed = []
+
+    def parse(res):
+        parsed.append(res.status_code)
+        return res.json()
+
+    first = client.get_cached(stub_server.url + '/projects', parse, credential='token')
+    second = client.get_cached(stub_server.url + '/projects', parse, credential='token')
+
+    assert first == {'count': 1}
+    assert second is first
+    assert parsed == [200]
+    assert 'If-None-Match' not in stub_server.requests[0][2]
+    assert stub_server.requests[1][2]['If-None-Match'] == '"v1"'
+
+
+def test_get_cached_is_keyed_by_credential(stub_server):
+    stub_server.respond('/projects', {'count': 1}, headers={'ETag': '"v1"'})
+    client = HTTPClient('test', retries=0)
+
+    client.get_cached(stub_server.url + '/projects', lambda res: res.json(), credential='token')
+    client.get_cached(stub_server.url + '/projects', lambda res: res.json(), credential='other token')
+
+    assert 'If-None-Match' not in stub_server.requests[1][2]
+
+
+def test_get_cached_does_not_cache_errors(stub_server):
+    stub_server.respond('/projects', status=404, headers={'ETag': '"v1"'})
+    client = HTTPClient('test', retries=0)
+
+    client.get_cached(stub_server.url + '/projects', lambda res: res.status_code)
+    client.get_cached(stub_server.url + '/projects', lambda res: res.status_code)
+
+    assert len(client.cache) == 0
+    assert 'If-None-Match' not in stub_server.requests[1][2]
+
+
+def test_get_cached_coalesces_concurrent_requests(stub_server):
+    stub_server.respond('/releases', {'count': 1}, delay=0.3)
+    client = HTTPClient('test', retries=0)
+
+    with futures.ThreadPoolExecutor(max_workers=4) as executor:
+        jobs = [executor.submit(client.get_cached, stub_server.url + '/releases', lambda res: res.json(), 'token')
+                for _ in range(4)]
+        results = [job.result() for job in jobs]
+
+    assert len(stub_server.requests) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_get_cached_does_not_coalesce_across_credentials(stub_server):
+    stub_server.respond('/releases', {'count': 1}, delay=0.3)
+    client = HTTPClient('test', retries=0, coalesce_window=10)
+
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        jobs = [executor.submit(client.get_cached, stub_server.url + '/releases', lambda res: res.json(), credential)
+                for credential in ('token', 'other token')]
+        [job.result() for job in jobs]
+
+    assert len(stub_server.requests) == 2
+
+
+def test_get_cached_reuses_recent_results_within_window(stub_server):
+    stub_server.respond('/releases', {'count': 1})
+    client = HTTPClient('test', retries=0, coalesce_window=10)
+
+    first = client.get_cached(stub_server.url + '/releases', lambda res: res.json(), credential='token')
+    second = client.get_cached(stub_server.url + '/releases', lambda res: res.json(), credential='token')
+
+    assert second is first
+    assert len(stub_server.requests) == 1
+
+
+def test_get_shared_coalesces_between_processes(stub_server):
+    stub_server.respond('/releases', {'count': 1}, delay=0.3)
+    shared = Store()
+    # separate clients stand in for separate worker processes, which only have the shared store in common
+    clients = [HTTPClient('test', retries=0, coalesce_window=10, shared=shared) for _ in range(2)]
+
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        jobs = [executor.submit(client.get_shared, stub_server.url + '/releases', lambda res: res.json(), 'token')
+                for client in clients]
+        results = [job.result() for job in jobs]
+
+    assert results == [{'count': 1}, {'count': 1}]
+    assert len(stub_server.requests) == 1
+
+
+def test_get_shared_does_not_share_between_credentials(stub_server):
+    stub_server.respond('/releases', {'count': 1})
+    clients = [HTTPClient('test', retries=0, coalesce_window=10, shared=Store()) for _ in range(2)]
+    clients[1].shared = clients[0].shared
+
+    clients[0].get_shared(stub_server.url + '/releases', lambda res: res.json(), 'token-1')
+    clients[1].get_shared(stub_server.url + '/releases', lambda res: res.json(), 'token-2')
+
+    assert len(stub_server.requests) == 2
+
+
+def test_get_shared_does_not_share_errors(stub_server):
+    stub_server.respond('/releases', status=500)
+    shared = Store()
+    clients = [HTTPClient('test', retries=0, coalesce_window=10, shared=shared) for _ in range(2)]
+
+    for client in clients:
+        assert client.get_shared(stub_server.url + '/releases', lambda res: res.json() if res.ok else None,
+                                 'token') is None
+
+    assert len(stub_server.requests) == 2
+
+
+def test_coalescer_shares_but_does_not_keep_failures():
+    coalescer = Coalescer(window=10)
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise requests.ConnectionError()
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            coalescer.run('key', fail)
+
+    assert len(calls) == 2
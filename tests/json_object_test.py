@@ -0,0 +1,144 @@
+import io
+import json
+
+import pytest
+
+from http_client import HTTPClient
+from json_object import JSONObject, Projection, json_backend
+
+
+@pytest.fixture
+def obj():
+    return JSONObject({
+        'name': 'pipeline',
+        'requests/count': {'sum': 10},
+        'class': 'release',
+        'environments': [{'id': 1}, {'id': 2}],
+        'tags': ['a', 'b'],
+    })
+
+
+def test_attribute_access(obj):
+    assert obj.name == 'pipeline'
+    assert obj.requests_count.sum == 10
+    assert obj.class_ == 'release'
+    assert [env.id for env in obj.environments] == [1, 2]
+    assert obj.tags == ['a', 'b']
+
+
+def test_item_access_uses_normalized_keys(obj):
+    assert obj['requests_count'] == {'sum': 10}
+    assert 'requests_count' in obj
+    assert 'requests/count' not in obj
+    with pytest.raises(KeyError):
+        obj['requests/count']
+    with pytest.raises(KeyError):
+        obj.missing
+
+
+def test_children_are_memoized(obj):
+    assert obj.environments is obj.environments
+    assert obj.requests_count is obj.requests_count
+
+
+def test_dict_methods_pass_through(obj):
+    assert obj.get('class_') == 'release'
+    assert 'requests_count' in obj.keys()
+
+
+def test_lists_are_wrapped():
+    assert [item.id for item in JSONObject([{'id': 1}, {'id': 2}])] == [1, 2]
+
+
+RELEASES = {
+    'count': 1,
+    'value': [{
+        'id': 1,
+        'name': 'Release-1',
+        '_links': {'web': {'href': 'https://example.com'}},
+        'environments': [
+            {'id': 10, 'status': 'succeeded', 'variables': {'a': {'value': 1}}, 'deploySteps': [{'attempt': 1}]},
+            {'id': 11, 'status': 'inProgress', 'variables': {}, 'deploySteps': []},
+        ]
+    }]
+}
+
+PROJECTION = Projection('value.id', 'value.environments.id', 'value.environments.status', 'missing.field')
+
+PROJECTED = {
+    'value': [{
+        'id': 1,
+        'environments': [{'id': 10, 'status': 'succeeded'}, {'id': 11, 'status': 'inProgress'}]
+    }]
+}
+
+
+def test_projection_apply():
+    assert PROJECTION.apply(RELEASES) == PROJECTED
+
+
+def test_projection_keeps_whole_values():
+    assert Projection('value.environments', 'value.environments.id').apply(RELEASES) == {
+        'value': [{'environments': RELEASES['value'][0]['environments']}]
+    }
+
+
+def test_projection_load_streams():
+    pytest.importorskip('ijson')
+
+    assert PROJECTION.load(io.BytesIO(json.dumps(RELEASES).encode('utf-8'))) == PROJECTED
+
+
+def test_projection_from_streamed_response(stub_server, monkeypatch):
+    pytest.importorskip('ijson')
+    monkeypatch.setattr(Projection, 'STREAM_THRESHOLD', 0)
+    stub_server.respond('/releases', RELEASES)
+    client = HTTPClient('test', retries=0)
+
+    assert client.get_cached(stub_server.url + '/releases', PROJECTION.from_response, stream=True) == PROJECTED
+
+
+def test_small_streamed_response_is_decoded_in_full(stub_server):
+    stub_server.respond('/releases', RELEASES)
+    res = HTTPClient('test', retries=0).get(stub_server.url + '/releases', stream=True)
+
+    assert PROJECTION.from_response(res) == PROJECTED
+    # left for whoever else reads the body
+    assert res.body_stream is not None
+
+
+def test_large_streamed_response_is_streamed_once(stub_server, monkeypatch):
+    pytest.importorskip('ijson')
+    monkeypatch.setattr(Projection, 'STREAM_THRESHOLD', 0)
+    stub_server.respond('/releases', RELEASES)
+    res = HTTPClient('test', retries=0).get(stub_server.url + '/releases', stream=True)
+
+    assert PROJECTION.from_response(res) == PROJECTED
+    assert res.body_stream is None
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({}, True),
+    ({'Content-Length': str(Projection.STREAM_THRESHOLD)}, False),
+    ({'Content-Length': str(Projection.STREAM_THRESHOLD + 1)}, True),
+    ({'Content-Length': str(Projection.STREAM_THRESHOLD // 2), 'Content-Encoding': 'gzip'}, True),
+    ({'Content-Length': str(Projection.STREAM_THRESHOLD // 8), 'Content-Encoding': 'gzip'}, False),
+])
+def test_projection_is_large(headers, expected):
+    assert PROJECTION.is_large(headers) == expected
+
+
+@pytest.mark.parametrize('name', ['orjson', 'ujson', 'json'])
+def test_json_backend_round_trip(name):
+    if not json_backend.available(name):
+        pytest.skip('{} is not installed'.format(name))
+    backend = json_backend.select(name)
+
+    assert backend.name == name
+    assert backend.loads(backend.dumps(RELEASES)) == RELEASES
+    assert backend.loads(backend.dumps_bytes(RELEASES)) == RELEASES
+
+
+def test_json_backend_falls_back_to_stdlib():
+    assert json_backend.select('missing') is json_backend.STDLIB
+    assert json_backend.select('auto').dumps({'big': 2 ** 70}) == '{"big":1180591620717411303424}'
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from ambrose import tasks
+from ambrose.api.status import publish_device_statuses
+from ambrose.common import db_transaction, mqtt
+from ambrose.common.mqtt import MemoryBroker, topic_matches
+from ambrose.models import db, Device, ApplicationInsightsMetricTask, LightSettings
+from ambrose.services import AuthService, UserService
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    queued = []
+    monkeypatch.setattr(tasks.publish_statuses, 'delay', queued.append)
+    return queued
+
+
+@pytest.fixture
+def broker(monkeypatch, queued):
+    monkeypatch.setattr(mqtt, 'url', 'memory://')
+    monkeypatch.setattr(mqtt, '_broker', None)
+    return mqtt.broker
+
+
+@pytest.fixture(scope='module')
+def task(user):
+    task = ApplicationInsightsMetricTask(metric='requests/count', user=user, _value='succeeded', has_changed=False)
+    user.add_setting(LightSettings(status='succeeded', color_green=255))
+    db.session.add(task)
+    db.session.commit()
+    return task
+
+
+@pytest.fixture
+def device(user, task):
+    device = Device('my device', 1, 0, True)
+    user.add_device(device)
+    db.session.commit()
+    device.set_task_for_light(task, 1)
+    db.session.commit()
+
+    yield device
+
+    if Device.by_id(device.id):
+        db.session.delete(device)
+        db.session.commit()
+
+
+@pytest.mark.parametrize('topic_filter, topic, expected', [
+    ('ambrose/devices/abc/status', 'ambrose/devices/abc/status', True),
+    ('ambrose/devices/+/status', 'ambrose/devices/abc/status', True),
+    ('ambrose/devices/#', 'ambrose/devices/abc/status', True),
+    ('ambrose/devices/+', 'ambrose/devices/abc/status', False),
+    ('ambrose/devices/abc/status', 'ambrose/devices/def/status', False),
+])
+def test_topic_matches(topic_filter, topic, expected):
+    assert topic_matches(topic_filter, topic) == expected
+
+
+def test_retained_message_is_sent_to_new_subscribers():
+    broker = MemoryBroker()
+    live = []
+    broker.subscribe('devices/+/status', live.append)
+
+    broker.publish('devices/a/status', 'first', qos=1, retain=True)
+    broker.publish('devices/a/status', 'second', qos=1, retain=True)
+    late = []
+    broker.subscribe('devices/a/status', late.append)
+    broker.publish('devices/a/status', '', qos=1, retain=True)
+    cleared = []
+    broker.subscribe('devices/a/status', cleared.append)
+
+    assert [(m.payload, m.retain) for m in live] == [(b'first', False), (b'second', False), (b'', False)]
+    assert [(m.payload, m.retain) for m in late] == [(b'second', True), (b'', False)]
+    assert cleared == []
+
+
+def test_status_is_published_retained(client, user, device, broker):
+    publish_device_statuses(user.id)
+    message = broker.retained[mqtt.topic(device.device_uuid)]
+
+    headers = {'Authorization': 'Bearer {}'.format(AuthService.jwt(device))}
+    polled = client.get('/api/status', headers=headers).json
+
+    assert message.qos == 1
+    assert message.retain
+    assert json.loads(message.payload) == polled
+
+
+def test_unchanged_status_is_not_published_again(user, device, task, broker):
+    publish_device_statuses(user.id)
+    publish_device_statuses(user.id)
+    published = len(broker.published)
+
+    with db_transaction():
+        task.value = 'failed'
+    publish_device_statuses(user.id)
+    with db_transaction():
+        task.value = 'succeeded'
+        task.has_changed = False
+
+    assert published == 1
+    assert len(broker.published) == 2
+
+
+def test_deleted_device_is_cleared(user, device, broker):
+    publish_device_statuses(user.id)
+    topic = mqtt.topic(device.device_uuid)
+
+    UserService(user).delete_device(device.id)
+
+    assert topic not in broker.retained
+
+
+def test_change_queues_publication(user, task, broker, queued):
+    with db_transaction():
+        task.nickname = 'renamed'
+
+    assert queued == [[user.id]]
@@ -0,0 +1,120 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from ambrose.common import single_flight, metrics
+from ambrose.models import db, Task, DevOpsBuildTask, ApplicationInsightsMetricTask
+from ambrose.services import AccountPoller, poll_offset, DevOpsAccountService, ApplicationInsightsAccountService
+from ambrose.tasks import update_accounts, poll_accounts
+
+
+@pytest.fixture
+def slow_devops(monkeypatch):
+    def poll(self):
+        time.sleep(0.2)
+
+    monkeypatch.setattr(DevOpsAccountService, 'poll', poll)
+
+
+@pytest.fixture
+def failing_appinsights(monkeypatch):
+    def poll(self):
+        raise RuntimeError('upstream unavailable')
+
+    monkeypatch.setattr(ApplicationInsightsAccountService, 'poll', poll)
+
+
+@pytest.mark.usefixtures('slow_devops', 'failing_appinsights')
+def test_poll_isolates_failures(app, cipher, devops_account, appinsights_account):
+    report = AccountPoller(app, cipher).poll([devops_account.id, appinsights_account.id])
+
+    assert len(report.results) == 2
+    assert [f.account_id for f in report.failures] == [appinsights_account.id]
+    assert isinstance(report.failures[0].error, RuntimeError)
+
+
+@pytest.mark.usefixtures('slow_devops')
+def test_poll_is_concurrent(app, cipher, user, faker):
+    accounts = [DevOpsAccountService(None, cipher).new_account(user, faker.email(), faker.word(), faker.sha1(), '')
+                for _ in range(4)]
+
+    report = AccountPoller(app, cipher, max_workers=4).poll(a.id for a in accounts)
+
+    assert len(report.results) == 4
+    assert report.account_time >= 0.8
+    assert report.wall_time < report.account_time
+
+
+@pytest.mark.usefixtures('slow_devops')
+def test_provider_limits(app, cipher, user, faker):
+    accounts = [DevOpsAccountService(None, cipher).new_account(user, faker.email(), faker.word(), faker.sha1(), '')
+                for _ in range(3)]
+
+    report = AccountPoller(app, cipher, max_workers=4, provider_limits={'devops_account': 1}).poll(a.id for a in accounts)
+
+    assert report.wall_time >= 0.6
+
+
+def test_poll_nothing(app, cipher):
+    report = AccountPoller(app, cipher).poll([])
+
+    assert report.results == []
+    assert report.wall_time == 0
+
+
+def test_update_accounts_dispatches_due_accounts(app, monkeypatch, devops_account, appinsights_account):
+    devops_account.add_task(DevOpsBuildTask(project='project', definition_id=1))
+    scheduled = ApplicationInsightsMetricTask(metric='requests/count')
+    appinsights_account.add_task(scheduled)
+    db.session.commit()
+    scheduled.defer_poll(Task.BASE_POLL_INTERVAL, datetime.now())
+    db.session.commit()
+
+    batches = []
+    monkeypatch.setattr(poll_accounts, 'apply_async', lambda args, **kwargs: batches.append(args[0]))
+    monkeypatch.setitem(app.config, 'POLLING_BATCH_SIZE', 1)
+
+    update_accounts()
+
+    assert devops_account.id in [b[0] for b in batches]
+    assert appinsights_account.id not in [b[0] for b in batches]
+    assert all(len(b) == 1 for b in batches)
+
+
+@pytest.mark.usefixtures('slow_devops')
+def test_poll_skips_account_in_flight(app, cipher, devops_account):
+    skipped = metrics.get('poll.account.skipped')
+
+    with single_flight('poll:account:{}'.format(devops_account.id), 60):
+        report = AccountPoller(app, cipher).poll([devops_account.id])
+
+    assert [r.account_id for r in report.skipped] == [devops_account.id]
+    assert metrics.get('poll.account.skipped') == skipped + 1
+
+
+def test_update_accounts_skips_overlapping_cycle(app, monkeypatch, devops_account):
+    batches = []
+    monkeypatch.setattr(poll_accounts, 'apply_async', lambda args, **kwargs: batches.append(args[0]))
+    skipped = metrics.get('poll.cycle.skipped')
+
+    with single_flight('poll:cycle', 60):
+        update_accounts()
+
+    assert batches == []
+    assert metrics.get('poll.cycle.skipped') == skipped + 1
+
+
+def test_poll_offset_is_stable():
+    assert poll_offset(42, 15) == poll_offset(42, 15)
+    assert 0 <= poll_offset(42, 15, jitter=2) - poll_offset(42, 15) <= 2
+
+
+def test_poll_offsets_are_spread_across_window():
+    window = 15
+    buckets = [0] * window
+    for account_id in range(1, 1501):
+        buckets[int(poll_offset(account_id, window))] += 1
+
+    assert min(buckets) > 50
+    assert max(buckets) < 150
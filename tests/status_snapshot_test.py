@@ -0,0 +1,280 @@
+import contextlib
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from ambrose.common import db_transaction
+from ambrose.api.status import status_delta
+from ambrose.models import db, Device, LightSettings, ApplicationInsightsMetricTask, DateTimeMessage, TaskMessage
+from ambrose.services import AuthService, StatusService
+
+
+@pytest.fixture(scope='module')
+def task(user):
+    task = ApplicationInsightsMetricTask(metric='requests/count', user=user, _value='succeeded', has_changed=False)
+    user.add_setting(LightSettings(status='succeeded', color_green=255))
+    user.add_setting(LightSettings(status='failed', color_red=255))
+    db.session.add(task)
+    db.session.commit()
+    return task
+
+
+@pytest.fixture
+def device(user, task):
+    device = Device('my device', 1, 0, True)
+    user.add_device(device)
+    db.session.commit()
+    device.set_task_for_light(task, 1)
+    db.session.commit()
+
+    yield device
+
+    db.session.delete(device)
+    db.session.commit()
+
+
+@pytest.fixture
+def headers(device):
+    return {'Authorization': 'Bearer {}'.format(AuthService.jwt(device))}
+
+
+@contextlib.contextmanager
+def count_queries():
+    statements = []
+
+    def before_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+
+
+def set_value(task, value, has_changed=True):
+    with db_transaction():
+        task.value = value
+        task.has_changed = has_changed
+
+
+def test_unchanged_status_is_served_without_queries(client, device, headers):
+    first = client.get('/api/status', headers=headers)
+
+    with count_queries() as statements:
+        second = client.get('/api/status', headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json == first.json
+    assert first.json['lights'][0]['primary_color'] == {'red': 0, 'green': 255, 'blue': 0}
+    assert statements == []
+
+
+def test_task_change_invalidates_snapshot(client, device, headers, task):
+    client.get('/api/status', headers=headers)
+    set_value(task, 'failed')
+
+    changed = client.get('/api/status', headers=headers).json
+    viewed = client.get('/api/status', headers=headers).json
+    with count_queries() as statements:
+        cached = client.get('/api/status', headers=headers).json
+
+    set_value(task, 'succeeded', has_changed=False)
+    assert changed['lights'][0]['type'] == 'initially_blinking'
+    assert changed['lights'][0]['primary_color'] == {'red': 255, 'green': 0, 'blue': 0}
+    # the first poll after the change resets has_changed, so it isn't kept
+    assert viewed['lights'][0]['type'] == 'steady'
+    assert cached == viewed
+    assert statements == []
+
+
+def test_rescheduling_keeps_snapshot(client, device, headers, task, user):
+    client.get('/api/status', headers=headers)
+    version = StatusService.version(user.id)
+
+    with db_transaction():
+        task.touch()
+
+    assert StatusService.version(user.id) == version
+    assert StatusService.snapshot(device.device_uuid) is not None
+
+
+def test_unchanged_poll_keeps_snapshot(client, device, headers, task, user):
+    client.get('/api/status', headers=headers)
+    version = StatusService.version(user.id)
+
+    with db_transaction():
+        task.last_update = datetime.now()
+
+    assert StatusService.version(user.id) == version
+
+
+def test_last_update_shown_in_message_invalidates_snapshot(device, task, user):
+    message = TaskMessage(text='{last_update}', task_id=task.id)
+    with db_transaction():
+        user.add_message(message)
+    version = StatusService.version(user.id)
+
+    with db_transaction():
+        task.last_update = datetime.now()
+    changed = StatusService.version(user.id)
+
+    with db_transaction() as session:
+        session.delete(message)
+    assert changed != version
+
+
+def test_setting_change_invalidates_snapshot(client, device, headers, user):
+    client.get('/api/status', headers=headers)
+    with db_transaction():
+        user.light_settings[0].color_green = 127
+
+    resp = client.get('/api/status', headers=headers)
+
+    with db_transaction():
+        user.light_settings[0].color_green = 255
+    assert resp.json['lights'][0]['primary_color'] == {'red': 0, 'green': 127, 'blue': 0}
+
+
+def test_message_with_seconds_is_not_kept(client, device, headers, user):
+    message = DateTimeMessage(text='{datetime}', dateformat='%H:%M:%S')
+    with db_transaction():
+        user.add_message(message)
+
+    client.get('/api/status', headers=headers)
+    snapshot = StatusService.snapshot(device.device_uuid)
+
+    with db_transaction() as session:
+        session.delete(message)
+    assert snapshot is None
+
+
+def test_current_etag_is_not_modified(client, device, headers, task):
+    first = client.get('/api/status', headers=headers)
+    etag = first.headers['ETag']
+
+    not_modified = client.get('/api/status', headers=dict(headers, **{'If-None-Match': etag}))
+    set_value(task, 'failed')
+    modified = client.get('/api/status', headers=dict(headers, **{'If-None-Match': etag}))
+    set_value(task, 'succeeded', has_changed=False)
+
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+    assert modified.status_code == 200
+    assert modified.headers['ETag'] != etag
+    assert modified.json['lights'][0]['primary_color'] == {'red': 255, 'green': 0, 'blue': 0}
+
+
+def read_event(events):
+    event = next(events)
+    return event.decode('utf-8') if isinstance(event, bytes) else event
+
+
+def status_event(event):
+    fields = dict(line.split(': ', 1) for line in event.strip().split('\n'))
+    assert fields['event'] == 'status'
+    return fields['id'], json.loads(fields['data'])
+
+
+def test_stream_pushes_changes(app, client, device, headers, task, monkeypatch):
+    monkeypatch.setitem(app.config, 'STATUS_STREAM_HEARTBEAT', 0.01)
+    resp = client.get('/api/status/stream', headers=headers, buffered=False)
+    events = iter(resp.response)
+
+    assert resp.mimetype == 'text/event-stream'
+    assert read_event(events).startswith('retry: ')
+    etag, first = status_event(read_event(events))
+    assert read_event(events) == ': heartbeat\n\n'
+
+    set_value(task, 'failed')
+    changed_etag, changed = status_event(read_event(events))
+    still_changed = task.has_changed
+    set_value(task, 'succeeded', has_changed=False)
+    resp.close()
+
+    assert first['lights'][0]['primary_color'] == {'red': 0, 'green': 255, 'blue': 0}
+    assert changed['lights'][0]['primary_color'] == {'red': 255, 'green': 0, 'blue': 0}
+    assert changed_etag != etag
+    assert changed['lights'][0]['type'] == 'initially_blinking'
+    # unlike a poll, a pushed status doesn't count as seen
+    assert still_changed
+
+
+def test_stream_resumes_from_last_event_id(app, client, device, headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'STATUS_STREAM_HEARTBEAT', 0.01)
+    etag = client.get('/api/status', headers=headers).headers['ETag'].strip('"')
+
+    resp = client.get('/api/status/stream', headers=dict(headers, **{'Last-Event-ID': etag}), buffered=False)
+    events = iter(resp.response)
+    read_event(events)
+    resumed = read_event(events)
+    resp.close()
+
+    assert resumed == ': heartbeat\n\n'
+
+
+def test_stream_looks_up_device_once_per_event(app, client, device, headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'STATUS_HISTORY_TTL', 60)
+    monkeypatch.setitem(app.config, 'STATUS_STREAM_HEARTBEAT', 0.01)
+    resp = client.get('/api/status/stream', headers=headers, buffered=False)
+    events = iter(resp.response)
+    read_event(events)
+
+    with count_queries() as statements:
+        etag, _ = status_event(read_event(events))
+        heartbeat = read_event(events)
+    resp.close()
+
+    lookups = [s for s in statements if 'device.device_uuid =' in s]
+    assert heartbeat == ': heartbeat\n\n'
+    assert len(lookups) == 1
+    assert StatusService.previous(device.device_uuid, etag) is not None
+
+
+def test_status_delta():
+    steady = {'type': 'steady', 'primary_color': {'red': 0, 'green': 255, 'blue': 0}}
+    blinking = {'type': 'initially_blinking', 'primary_color': {'red': 255, 'green': 0, 'blue': 0}}
+    previous = {'lights': [steady, steady, steady], 'messages': ['a', 'b'], 'gauges': [{'position': 0.5}]}
+    current = {'lights': [steady, blinking, steady], 'messages': ['a'], 'gauges': [{'position': 0.5}, {'position': 1}]}
+
+    assert status_delta(previous, current) == {
+        'delta': True,
+        'lights': [dict(blinking, slot=2)],
+        'messages': [],
+        'gauges': [{'position': 1, 'index': 1}],
+        'sizes': {'lights': 3, 'messages': 1, 'gauges': 2},
+    }
+
+
+def test_status_since_version(client, device, headers, task):
+    etag = client.get('/api/status', headers=headers).headers['ETag'].strip('"')
+    set_value(task, 'failed')
+
+    delta = client.get('/api/status?since={}'.format(etag), headers=headers)
+    unknown = client.get('/api/status?since=unknown', headers=headers)
+    set_value(task, 'succeeded', has_changed=False)
+
+    assert delta.json['delta']
+    assert [light['slot'] for light in delta.json['lights']] == [1]
+    assert delta.json['lights'][0]['primary_color'] == {'red': 255, 'green': 0, 'blue': 0}
+    assert delta.json['sizes'] == {'lights': 1, 'messages': 0, 'gauges': 0}
+    assert delta.headers['ETag'] != '"{}"'.format(etag)
+    # a version that is no longer kept gets the full status
+    assert 'delta' not in unknown.json
+    assert unknown.json['lights'][0]['type'] == 'steady'
+
+
+def test_lights_are_ordered_by_slot(device):
+    device.set_task_for_light(None, 3)
+    device.set_task_for_light(None, 2)
+    db.session.commit()
+    db.session.expire(device)
+
+    assert [light.slot for light in device.lights] == [1, 2, 3]
+
+
+def test_invalid_token_is_rejected(client, device):
+    resp = client.get('/api/status', headers={'Authorization': 'Bearer not-a-token'})
+    assert resp.status_code == 422
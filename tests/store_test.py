@@ -0,0 +1,88 @@
+import time
+
+from ambrose.common import single_flight
+from ambrose.common.store import Store
+
+
+def test_add_only_sets_missing_keys():
+    store = Store()
+
+    assert store.add('key', 'a')
+    assert not store.add('key', 'b')
+    assert store.get('key') == 'a'
+
+
+def test_ttl_expires():
+    store = Store()
+    store.set('key', 'a', ttl=0.05)
+
+    time.sleep(0.1)
+
+    assert store.get('key') is None
+    assert store.add('key', 'b')
+
+
+def test_delete_if():
+    store = Store()
+    store.set('key', 'a')
+
+    assert not store.delete_if('key', 'b')
+    assert store.delete_if('key', 'a')
+    assert store.get('key') is None
+
+
+def test_incr():
+    store = Store()
+
+    assert store.incr('counter') == 1
+    assert store.incr('counter', 4) == 5
+
+
+def test_publish_reaches_current_subscribers():
+    store = Store()
+    store.publish('channel', 'before')
+    subscription = store.subscribe('channel', 'other')
+
+    store.publish('channel', 'a')
+    store.publish('other', 'b')
+    store.publish('unrelated', 'c')
+
+    assert subscription.get(timeout=0) == 'a'
+    assert subscription.get(timeout=0) == 'b'
+    assert subscription.get(timeout=0.01) is None
+
+    subscription.close()
+    store.publish('channel', 'after')
+    assert subscription.get(timeout=0) is None
+
+
+def test_fanout_shares_one_backend_subscription():
+    store = Store()
+    fanout = store.fanout('changed:*')
+    first, also_first = fanout.subscribe('changed:1'), fanout.subscribe('changed:1')
+    second = store.fanout('changed:*').subscribe('changed:2')
+
+    store.publish('changed:1', 'a')
+    store.publish('changed:2', 'b')
+    store.publish('unrelated', 'c')
+
+    assert first.get(timeout=1) == 'a'
+    assert also_first.get(timeout=1) == 'a'
+    assert second.get(timeout=1) == 'b'
+    assert first.get(timeout=0.05) is None
+    assert [len(subscriptions) for subscriptions in store.backend._pattern_subscriptions.values()] == [1]
+
+    first.close()
+    store.publish('changed:1', 'after')
+    assert also_first.get(timeout=1) == 'after'
+    assert first.get(timeout=0.05) is None
+
+
+def test_single_flight(app):
+    with single_flight('work', 60) as first:
+        with single_flight('work', 60) as second:
+            assert first
+            assert not second
+
+    with single_flight('work', 60) as third:
+        assert third
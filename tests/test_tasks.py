@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from ambrose.models import Task, DevOpsReleaseTask
+
+
+@pytest.fixture
+def now():
+    return datetime(2019, 7, 1, 12, 0, 0)
+
+
+@pytest.mark.parametrize('previous, value, interval, expected', [
+    ('succeeded', 'inprogress', 240, Task.FAST_POLL_INTERVAL),
+    ('inprogress', 'pending_approval', 15, Task.FAST_POLL_INTERVAL),
+    ('inprogress', 'succeeded', 15, Task.BASE_POLL_INTERVAL),
+    ('succeeded', 'succeeded', 60, 120),
+    ('succeeded', 'succeeded', 120, 240),
+    ('succeeded', 'succeeded', None, Task.BASE_POLL_INTERVAL),
+    ('succeeded', 'succeeded', Task.MAX_POLL_INTERVAL, Task.MAX_POLL_INTERVAL),
+])
+def test_schedule_next_poll(now, previous, value, interval, expected):
+    task = DevOpsReleaseTask(_value=value, poll_interval=interval)
+
+    task.schedule_next_poll(previous, now)
+
+    assert task.poll_interval == expected
+    assert task.next_poll_at == now + timedelta(seconds=expected)
+    assert not task.is_due(now)
+    assert task.is_due(task.next_poll_at)
+
+
+def test_touch(now):
+    task = DevOpsReleaseTask(_value='succeeded', poll_interval=Task.MAX_POLL_INTERVAL,
+                             next_poll_at=now + timedelta(hours=1))
+
+    task.touch(now)
+
+    assert task.is_due(now)
+    assert task.poll_interval == Task.BASE_POLL_INTERVAL
+
+
+@pytest.mark.parametrize('interval, expected', [
+    (None, Task.BASE_POLL_INTERVAL * 2),
+    (Task.FAST_POLL_INTERVAL, Task.BASE_POLL_INTERVAL * 2),
+    (240, 480),
+    (Task.MAX_POLL_INTERVAL, Task.MAX_POLL_INTERVAL),
+])
+def test_back_off(now, interval, expected):
+    task = DevOpsReleaseTask(_value='succeeded', poll_interval=interval)
+
+    task.back_off(now)
+
+    assert task.poll_interval == expected
+    assert task.next_poll_at == now + timedelta(seconds=expected)
+
+
+def test_update_touches_task_when_always_poll_is_switched_on(now):
+    task = DevOpsReleaseTask(_value='succeeded', always_poll=False, poll_interval=Task.MAX_POLL_INTERVAL,
+                             next_poll_at=now + timedelta(hours=1))
+
+    task.update({'always_poll': False})
+    assert not task.is_due(now)
+
+    task.update({'always_poll': True})
+    assert task.always_poll
+    assert task.poll_interval == Task.BASE_POLL_INTERVAL
+    assert task.is_due(datetime.now())